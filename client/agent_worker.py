@@ -0,0 +1,88 @@
+"""
+Agent worker for the game "I Like Trains"
+Runs the agent's decisions outside of the network receive thread
+"""
+
+import logging
+import threading
+
+
+logger = logging.getLogger("client.agent_worker")
+
+# How long the worker waits for a new state before checking if it should stop
+WAIT_TIMEOUT_SECONDS = 0.5
+
+
+class AgentWorker:
+    """
+    Calls the agent on a dedicated thread. The worker is notified when a new
+    state is available: by the main loop once it applied the state, or by the
+    receive thread without a window, the worker then applying it. If several
+    states arrive while the agent is busy, the agent is only called once, on
+    the latest state.
+    """
+
+    def __init__(self, client, agent):
+        self.client = client
+        self.agent = agent
+        self.new_state = threading.Event()
+        self.running = True
+        self.nb_decisions = 0
+        # States replaced by a newer one before the agent saw them
+        self.nb_skipped_states = 0
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def notify(self):
+        """Called when a new game state is available"""
+        if self.new_state.is_set():
+            self.nb_skipped_states += 1
+        self.new_state.set()
+
+    def sync_agent(self):
+        """
+        Give the agent the latest snapshot of the game state. Return False if
+        no state was received yet.
+        """
+        game_state = self.client.game_state
+        # Without a window, no other thread applies the state
+        if self.client.headless:
+            game_state.update()
+        snapshot = game_state.snapshot
+        if snapshot is None:
+            return False
+
+        self.agent.all_trains = snapshot["all_trains"]
+        self.agent.passengers = snapshot["passengers"]
+        self.agent.delivery_zone = snapshot["delivery_zone"]
+        self.agent.cell_size = snapshot["cell_size"]
+        self.agent.game_width = snapshot["game_width"]
+        self.agent.game_height = snapshot["game_height"]
+        self.agent.screen_width = snapshot["screen_width"]
+        self.agent.screen_height = snapshot["screen_height"]
+        return True
+
+    def run(self):
+        """Worker loop, calls the agent each time a new state is available"""
+        while self.running:
+            if not self.new_state.wait(timeout=WAIT_TIMEOUT_SECONDS):
+                continue
+            self.new_state.clear()
+
+            try:
+                if not self.sync_agent():
+                    continue
+                self.agent.update_agent()
+                self.nb_decisions += 1
+            except Exception as e:
+                logger.error(f"Error updating agent: {e}")
+
+    def stop(self):
+        """Stop the worker thread"""
+        self.running = False
+        self.new_state.set()
+        logger.debug(
+            f"Agent worker stopped after {self.nb_decisions} decisions, {self.nb_skipped_states} states skipped"
+        )
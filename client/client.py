@@ -1,15 +1,13 @@
-import pygame
 import logging
 import time
 import threading
 import sys
-import importlib
 
+from client.agent_worker import AgentWorker
 from client.network import NetworkManager
-from client.renderer import Renderer
-from client.event_handler import EventHandler
 from client.game_state import GameState
 
+from common.agent_registry import AgentRegistry
 from common.config import Config
 from common.client_config import GameMode
 
@@ -22,6 +20,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger("client")
 
+# How often the headless main loop checks whether the agent should respawn
+HEADLESS_LOOP_INTERVAL_SECONDS = 0.05
+
+# pygame is only imported when there is a window to show (see import_pygame),
+# so that agents running headless don't need it
+pygame = None
+
+
+def import_pygame():
+    """Import pygame into this module, once"""
+    global pygame
+    if pygame is None:
+        import pygame as pygame_module
+
+        pygame = pygame_module
+
 
 class Client:
     """Main client class"""
@@ -87,45 +101,64 @@ class Client:
             "height": self.screen_height,
         }
 
-        # Initialize pygame but don't create window yet
-        pygame.init()
-        self.screen = pygame.display.set_mode(
-            (self.screen_width, self.screen_height), pygame.RESIZABLE
-        )
-        pygame.display.set_caption("I Like Trains")
-        self.is_initialized = True
+        # Only agents can play without a window, observers and players need one
+        self.headless = self.config.headless and self.game_mode == GameMode.AGENT
+        if self.config.headless and not self.headless:
+            logger.warning("Headless mode is only available in agent mode, ignoring it")
 
         # Initialize components
         self.network = NetworkManager(self, host, self.config.port)
-        self.renderer = Renderer(self)
-
-        self.event_handler = EventHandler(self, self.game_mode)
         self.game_state = GameState(self, self.game_mode)
 
+        # The game is drawn on self.screen at its own size, and shown in
+        # self.window, scaled if the user resized the window
+        self.screen = None
+        self.window = None
+        self.window_sized_for_game = False
+        self.renderer = None
+        self.event_handler = None
+        self.hud = None
+        if not self.headless:
+            import_pygame()
+            from client.renderer import Renderer
+            from client.event_handler import EventHandler
+            from client.hud import Hud
+
+            # Initialize pygame but don't create window yet
+            pygame.init()
+            self.window = pygame.display.set_mode(
+                (self.screen_width, self.screen_height), pygame.RESIZABLE
+            )
+            self.screen = self.window
+            pygame.display.set_caption("I Like Trains")
+            self.is_initialized = True
+
+            self.renderer = Renderer(self)
+            self.event_handler = EventHandler(self, self.game_mode)
+            self.hud = Hud(self)
+
         # Initialize agent based on game mode
         self.agent = None
         if self.game_mode != GameMode.OBSERVER:
             agent_info = self.config.agent
-            if agent_info and "agent_file_name" in agent_info:
-                logger.info(f"Loading agent: {agent_info['agent_file_name']}")
-                agent_file_name = agent_info["agent_file_name"]
-                if agent_file_name.endswith(".py"):
-                    # Remove .py extension
-                    agent_file_name = agent_file_name[:-3]
-
-                # Construct the module path correctly
-                module_path = f"common.agents.{agent_file_name}"
-                logger.info(f"Importing module: {module_path}")
+            logger.info(f"Loading agent: {agent_info.agent_file_name}")
+            try:
+                # The registry validates the module before handing out its Agent class
+                if self.game_mode == GameMode.MANUAL:
+                    self.nickname = self.config.manual.nickname
+                else:
+                    self.nickname = agent_info.nickname
+                self.agent = AgentRegistry().create_agent(
+                    agent_info.agent_file_name, self.nickname, self.network
+                )
+            except Exception as e:
+                logger.error(f"Error importing agent module: {e}")
+                raise e
 
-                try:
-                    # Add parent directory to Python path to allow importing agents package
-                    module = importlib.import_module(module_path)
-                    self.nickname = agent_info["nickname"]
-                    # self.agent_sciper = agent_info["sciper"]
-                    self.agent = module.Agent(self.nickname, self.network)
-                except Exception as e:
-                    logger.error(f"Error importing agent module: {e}")
-                    raise e
+        # In agent mode, decisions are taken outside of the network receive thread
+        self.agent_worker = None
+        if self.game_mode == GameMode.AGENT:
+            self.agent_worker = AgentWorker(self, self.agent)
 
         self.ping_response_received = False
         self.server_disconnected = False
@@ -140,19 +173,76 @@ class Client:
         """Process any pending window updates in the main thread"""
         with self.lock:
             if self.window_needs_update:
-                width = self.window_update_params["width"]
-                height = self.window_update_params["height"]
+                width = int(self.window_update_params["width"])
+                height = int(self.window_update_params["height"])
 
                 try:
-                    self.screen = pygame.display.set_mode(
-                        (width, height), pygame.RESIZABLE
-                    )
-                    pygame.display.set_caption("I Like Trains")
+                    # The window takes the size of the game once. When the game
+                    # grows later on, it is scaled to the window instead of
+                    # creating the window again.
+                    if not self.window_sized_for_game:
+                        self.window = pygame.display.set_mode(
+                            (width, height), pygame.RESIZABLE
+                        )
+                        pygame.display.set_caption("I Like Trains")
+                        self.window_sized_for_game = True
+                    self.update_screen_surface(width, height)
                 except Exception as e:
                     logger.error(f"Error updating window: {e}")
 
                 self.window_needs_update = False
 
+    def handle_window_resize(self):
+        """Called when the user resized the window, the game is scaled to its new size"""
+        # pygame resizes the display surface of resizable windows by itself
+        self.window = pygame.display.get_surface()
+        self.window_sized_for_game = True
+        self.update_screen_surface(int(self.screen_width), int(self.screen_height))
+
+    def update_screen_surface(self, width, height):
+        """Create the surface the game is drawn on, at the size of the game"""
+        if (width, height) == self.window.get_size():
+            # Draw directly in the window when no scaling is needed
+            screen = self.window
+        elif self.screen is not self.window and self.screen.get_size() == (
+            width,
+            height,
+        ):
+            screen = self.screen
+        else:
+            screen = pygame.Surface((width, height))
+
+        if screen is not self.screen:
+            self.screen = screen
+            # Nothing was drawn on the new surface yet
+            self.renderer.needs_full_redraw = True
+
+    def present(self, rects=None):
+        """
+        Show what was drawn on self.screen. rects are the areas which changed,
+        None meaning the whole screen.
+        """
+        if self.screen is self.window:
+            if rects is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(rects)
+            return
+
+        # Scale the game to fit the window, keeping its proportions
+        window_width, window_height = self.window.get_size()
+        width, height = self.screen.get_size()
+        scale = min(window_width / width, window_height / height)
+        viewport = pygame.Rect(0, 0, int(width * scale), int(height * scale))
+        viewport.center = (window_width // 2, window_height // 2)
+
+        # Black bars around the game when the proportions differ
+        self.window.fill((0, 0, 0))
+        pygame.transform.smoothscale(
+            self.screen, viewport.size, self.window.subsurface(viewport)
+        )
+        pygame.display.flip()
+
     def run(self):
         """Main client loop"""
         logger.info("Starting client loop")
@@ -182,6 +272,9 @@ class Client:
             logger.error(
                 f"Failed to connect to server after {connection_timeout} seconds timeout"
             )
+            if self.headless:
+                return
+
             # Show error message to user
             if self.screen:
                 font = pygame.font.Font(None, 26)
@@ -203,14 +296,19 @@ class Client:
             pygame.quit()
             return
 
-        # Create a temporary window for player name
-        temp_width, temp_height = self.config.screen_width, self.config.screen_height
-        try:
-            self.screen = pygame.display.set_mode((temp_width, temp_height))
-            pygame.display.set_caption("I Like Trains - Login")
-        except Exception as e:
-            logger.error(f"Error creating login window: {e}")
-            return
+        if not self.headless:
+            # Create a temporary window for player name
+            temp_width, temp_height = (
+                self.config.screen_width,
+                self.config.screen_height,
+            )
+            try:
+                self.window = pygame.display.set_mode((temp_width, temp_height))
+                self.screen = self.window
+                pygame.display.set_caption("I Like Trains - Login")
+            except Exception as e:
+                logger.error(f"Error creating login window: {e}")
+                return
 
         if not self.network.send_agent_ids(
             self.config.agent.nickname if self.game_mode == GameMode.AGENT else self.config.manual.nickname if self.game_mode == GameMode.MANUAL else "",
@@ -220,40 +318,72 @@ class Client:
             logger.error("Failed to send agent ids to server")
             return
 
-        # Main loop
-        clock = pygame.time.Clock()
         logger.info(f"Running client loop: {self.running}")
+        if self.headless:
+            self.run_headless_loop()
+        else:
+            self.run_window_loop()
+
+        # Close connection
+        if self.agent_worker:
+            self.agent_worker.stop()
+        self.network.disconnect()
+        if not self.headless:
+            pygame.quit()
+
+    def run_window_loop(self):
+        """Main loop with a window, rendering the game at 60 FPS"""
+        clock = pygame.time.Clock()
         while self.running:
             # Handle events
             self.event_handler.handle_events()
+            # Apply the state received since the last frame
+            self.game_state.update()
             # Handle any pending window updates in the main thread
             self.handle_window_updates()
 
-            # If no agent is set, skip the rest of the loop
-            if self.agent:
-                # Add automatic respawn logic
-                if (
-                    not self.config.manual_spawn
-                    and self.agent.is_dead
-                    and self.agent.waiting_for_respawn
-                    and not self.game_over
-                ):
-                    elapsed = time.time() - self.agent.death_time
-                    if elapsed >= self.agent.respawn_cooldown:
-                        self.network.send_spawn_request()
+            self.check_respawn()
 
             self.renderer.draw_game()
 
             # Limit FPS
             clock.tick(60)
 
-        # Close connection
-        self.network.disconnect()
-        pygame.quit()
+    def run_headless_loop(self):
+        """
+        Main loop without a window. The agent worker applies the states and
+        takes the decisions, this loop only respawns the train and stops the
+        client when the game is over.
+        """
+        while self.running:
+            if self.game_over:
+                logger.info("Game over, stopping headless client")
+                self.running = False
+                break
+
+            self.check_respawn()
+            time.sleep(HEADLESS_LOOP_INTERVAL_SECONDS)
+
+    def check_respawn(self):
+        """Request a respawn once the cooldown is over, unless manual_spawn is set"""
+        # If no agent is set, there is nothing to respawn
+        if not self.agent:
+            return
+
+        # Add automatic respawn logic
+        if (
+            not self.config.manual_spawn
+            and self.agent.is_dead
+            and self.agent.waiting_for_respawn
+            and not self.game_over
+        ):
+            elapsed = time.time() - self.agent.death_time
+            if elapsed >= self.agent.respawn_cooldown:
+                self.network.send_spawn_request()
 
-    def handle_state_data(self, data):
+    def handle_state_data(self, data, keyframe=False):
         """Handle state data received from server"""
-        self.game_state.handle_state_data(data)
+        self.game_state.handle_state_data(data, keyframe)
 
     def handle_death(self, data):
         """Handle cooldown data received from server"""
@@ -291,6 +421,10 @@ class Client:
 
         logger.info(f"Game lifetime set to {self.game_life_time} seconds")
 
+        # The agent needs the tick rate to know the deadline of its next move
+        if self.agent:
+            self.agent.tick_rate = data.get("tick_rate")
+
     def get_remaining_time(self):
         """Calculate remaining game time in seconds"""
         if not hasattr(self, "game_life_time") or not hasattr(self, "game_start_time"):
@@ -308,7 +442,7 @@ class Client:
         self.running = False
 
         # Afficher un message à l'utilisateur si pygame est initialisé
-        if hasattr(self, "renderer") and self.renderer and pygame.display.get_init():
+        if self.renderer and self.display_initialized():
             try:
                 font = pygame.font.SysFont("Arial", 24)
                 text = font.render(
@@ -346,10 +480,14 @@ class Client:
             self.network.disconnect()
 
         # Quitter pygame
-        if pygame.display.get_init():
+        if self.display_initialized():
             pygame.quit()
 
         # Quitter le programme
         if self.server_disconnected:
             logger.info("Exiting due to server disconnection")
             sys.exit(0)
+
+    def display_initialized(self):
+        """Return True if pygame was imported and its display is initialized"""
+        return pygame is not None and pygame.display.get_init()
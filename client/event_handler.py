@@ -28,7 +28,16 @@ class EventHandler:
                 self.client.running = False
                 return
 
+            elif event.type == pygame.VIDEORESIZE:
+                # The game is scaled to the new size of the window
+                self.client.handle_window_resize()
+
             elif event.type == pygame.KEYDOWN:
+                # F3 shows or hides the performance overlay
+                if event.key == pygame.K_F3:
+                    self.client.hud.toggle()
+                    continue
+
                 # If game is over, only handle ESC key to exit
                 if self.client.game_over:
                     if event.key == pygame.K_ESCAPE:
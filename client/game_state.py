@@ -2,6 +2,8 @@ import json
 import logging
 import time
 
+from client.state_buffer import StateBuffer
+from client.timeline import TrainTimeline
 from common.client_config import GameMode
 
 
@@ -15,108 +17,190 @@ class GameState:
         """Initialize the game state manager with a reference to the client"""
         self.client = client
         self.game_mode = game_mode
-
-    def handle_state_data(self, data):
+        # The client's game data is only updated by one thread (see update),
+        # the agent worker reads this copy of it instead
+        self.snapshot = None
+
+        # Deltas received from the server and not applied yet
+        self.state_buffer = StateBuffer()
+        self.last_state_receive_time = None
+
+        # Recent train positions, used to draw the trains between states
+        self.timeline = None
+        if client.config.interpolate_trains:
+            self.timeline = TrainTimeline(
+                client.config.interpolation_delay_seconds,
+                client.config.max_extrapolation_seconds,
+            )
+
+        # What changed since the renderer last asked, used to redraw only that
+        self.changed_trains = set()
+        self.passengers_changed = False
+        self.leaderboard_changed = False
+
+    def handle_state_data(self, data, keyframe=False):
         """Handle game state data received from the server"""
         try:
             if not isinstance(data, dict):
                 logger.warning("Received non-dictionary state data: " + str(data))
                 return
 
-            # Update game data only if present in the packet
-            if "trains" in data:
-                # Update only the modified trains
-                for nickname, train_data in data["trains"].items():
-                    if nickname not in self.client.trains:
-                        self.client.trains[nickname] = {}
-                    # Update the modified attributes
-                    self.client.trains[nickname].update(train_data)
-
-                if self.game_mode == GameMode.AGENT:
-                    self.client.agent.all_trains = self.client.trains
-
-            # Handle renamed train
-            if "rename_train" in data:
-                old_name, new_name = data["rename_train"]
-                if old_name in self.client.trains:
-                    logger.info(f"Renaming train {old_name} to {new_name}")
-                    self.client.trains[new_name] = self.client.trains.pop(old_name)
-                    if self.game_mode == GameMode.AGENT:
-                        self.client.agent.all_trains = self.client.trains
-
-            if "passengers" in data:
-                # Adjust passenger positions to be in pixel coordinates
-                self.client.passengers = data["passengers"]
-                if self.game_mode == GameMode.AGENT:
-                    self.client.agent.passengers = self.client.passengers
-
-            if "delivery_zone" in data:
-                # Update delivery zone
-                self.client.delivery_zone = data["delivery_zone"]
-                if self.game_mode == GameMode.AGENT:
-                    self.client.agent.delivery_zone = self.client.delivery_zone
-
-            if "size" in data:
-                self.client.game_width = data["size"]["game_width"]
-                self.client.game_height = data["size"]["game_height"]
-                try:
-                    # Recalculate screen dimensions
-                    self.client.screen_width = (
-                        self.client.leaderboard_width
-                        + self.client.game_width
-                        + 2.5 * self.client.game_screen_padding
-                    )
-                    self.client.screen_height = max(
-                        self.client.game_height + 2 * self.client.game_screen_padding,
-                        self.client.leaderboard_height,
-                    )
+            # Only merge the delta here, consumers apply it at their own rate
+            self.state_buffer.push(data, keyframe)
 
-                    logger.info(
-                        f"Updated game dimensions: game width = {self.client.game_width}, screen width = {self.client.screen_width}"
-                    )
+            # Without a window, the agent worker applies the state itself once
+            # it is free
+            if self.game_mode == GameMode.AGENT and self.client.headless:
+                self.client.agent_worker.notify()
 
-                    # Schedule window update instead of directly creating the window
-                    # This will be handled by the main thread
-                    self.client.update_game_window_size(
-                        self.client.screen_width, self.client.screen_height
-                    )
+        except Exception as e:
+            logger.error("Error handling state data: " + str(e))
 
-                    # Mark as initialized to prevent default window creation
-                    self.client.is_initialized = True
-                    if self.game_mode == GameMode.AGENT:
-                        self.client.agent.screen_width = self.client.screen_width
-                        self.client.agent.screen_height = self.client.screen_height
-
-                except Exception as e:
-                    logger.error("Error handling game size update: " + str(e))
-
-            if "cell_size" in data:
-                self.client.cell_size = data["cell_size"]
-                logger.info(f"Cell size updated: {self.client.cell_size}")
-                if self.game_mode == GameMode.AGENT:
-                    self.client.agent.cell_size = self.client.cell_size
-
-            # Update the agent's state
-            if self.game_mode == GameMode.AGENT:
-                # Make sure any data not updated individually gets updated here
-                if self.client.agent.all_trains is None:
-                    self.client.agent.all_trains = self.client.trains
-                if self.client.agent.passengers is None:
-                    self.client.agent.passengers = self.client.passengers
-                if self.client.agent.cell_size is None:
-                    self.client.agent.cell_size = self.client.cell_size
-                if self.client.agent.game_width is None:
-                    self.client.agent.game_width = self.client.game_width
-                if self.client.agent.game_height is None:
-                    self.client.agent.game_height = self.client.game_height
-                if self.client.agent.delivery_zone is None:
-                    self.client.agent.delivery_zone = self.client.delivery_zone
-
-                self.client.agent.update_agent()
+    def update(self):
+        """
+        Apply the state received since the last call. Called by the single
+        consumer of the game state: the main loop when there is a window, the
+        agent worker otherwise. In agent mode, the state is then copied for
+        the agent worker.
+        """
+        renames, data, receive_time, keyframe = self.state_buffer.pop()
+        if receive_time is None:
+            return
 
+        try:
+            if keyframe:
+                self.clear_world(data)
+            for old_name, new_name in renames:
+                if old_name in self.client.trains:
+                    logger.info(f"Renaming train {old_name} to {new_name}")
+                    self.client.trains[new_name] = self.client.trains.pop(old_name)
+                    self.changed_trains.update((old_name, new_name))
+                    self.leaderboard_changed = True
+                    if self.timeline:
+                        self.timeline.rename(old_name, new_name)
+            self.apply_state_data(data)
+
+            if self.timeline:
+                self.timeline.record(
+                    self.client.trains, data.get("trains", {}), receive_time
+                )
         except Exception as e:
             logger.error("Error handling state data: " + str(e))
 
+        self.last_state_receive_time = receive_time
+
+        if self.game_mode == GameMode.AGENT:
+            self.publish_snapshot()
+
+    def publish_snapshot(self):
+        """Copy the game data for the agent worker, which reads it on its own thread"""
+        client = self.client
+        # Each train is copied, the dicts of the client keep being updated
+        self.snapshot = {
+            "all_trains": {
+                nickname: dict(train_data)
+                for nickname, train_data in client.trains.items()
+            },
+            "passengers": list(client.passengers),
+            "delivery_zone": client.delivery_zone,
+            "cell_size": client.cell_size,
+            "game_width": client.game_width,
+            "game_height": client.game_height,
+            "screen_width": client.screen_width,
+            "screen_height": client.screen_height,
+        }
+        # With a window, the worker is woken up once the main loop applied the state
+        if not client.headless:
+            client.agent_worker.notify()
+
+    def clear_world(self, keyframe):
+        """Forget the world before applying a keyframe, which replaces it"""
+        self.changed_trains.update(self.client.trains)
+        self.leaderboard_changed = True
+        self.client.trains.clear()
+        if "delivery_zone" not in keyframe:
+            self.client.delivery_zone = {}
+
+    def pop_render_changes(self):
+        """
+        Return and reset what changed since the last call, as a tuple
+        (changed train nicknames, passengers changed, leaderboard changed)
+        """
+        changes = (
+            self.changed_trains,
+            self.passengers_changed,
+            self.leaderboard_changed,
+        )
+        self.changed_trains = set()
+        self.passengers_changed = False
+        self.leaderboard_changed = False
+        return changes
+
+    def get_state_age(self):
+        """Return how many seconds ago the state being displayed was received"""
+        if self.last_state_receive_time is None:
+            return None
+        return time.time() - self.last_state_receive_time
+
+    def apply_state_data(self, data):
+        """Merge a state update into the client's game data"""
+        # Update game data only if present in the packet
+        if "trains" in data:
+            # Update only the modified trains
+            for nickname, train_data in data["trains"].items():
+                if nickname not in self.client.trains:
+                    self.client.trains[nickname] = {}
+                    self.leaderboard_changed = True
+                # Update the modified attributes
+                self.client.trains[nickname].update(train_data)
+                self.changed_trains.add(nickname)
+                if any(key in train_data for key in ("score", "alive", "color")):
+                    self.leaderboard_changed = True
+
+        if "passengers" in data:
+            # Adjust passenger positions to be in pixel coordinates
+            self.client.passengers = data["passengers"]
+            self.passengers_changed = True
+
+        if "delivery_zone" in data:
+            # Update delivery zone
+            self.client.delivery_zone = data["delivery_zone"]
+
+        if "size" in data:
+            self.client.game_width = data["size"]["game_width"]
+            self.client.game_height = data["size"]["game_height"]
+            try:
+                # Recalculate screen dimensions
+                self.client.screen_width = (
+                    self.client.leaderboard_width
+                    + self.client.game_width
+                    + 2.5 * self.client.game_screen_padding
+                )
+                self.client.screen_height = max(
+                    self.client.game_height + 2 * self.client.game_screen_padding,
+                    self.client.leaderboard_height,
+                )
+
+                logger.info(
+                    f"Updated game dimensions: game width = {self.client.game_width}, screen width = {self.client.screen_width}"
+                )
+
+                # Schedule window update instead of directly creating the window
+                # This will be handled by the main thread
+                self.client.update_game_window_size(
+                    self.client.screen_width, self.client.screen_height
+                )
+
+                # Mark as initialized to prevent default window creation
+                self.client.is_initialized = True
+
+            except Exception as e:
+                logger.error("Error handling game size update: " + str(e))
+
+        if "cell_size" in data:
+            self.client.cell_size = data["cell_size"]
+            logger.info(f"Cell size updated: {self.client.cell_size}")
+
     def handle_leaderboard_data(self, data):
         """Handle leaderboard data received from the server"""
         logger.info("Received leaderboard data")
@@ -245,5 +329,13 @@ class GameState:
             logger.info(f"Game over: {data.get('message', 'Time limit reached')}")
             logger.info(f"Final scores: {self.client.final_scores}")
 
+            # Report how long the agents took to decide on their moves
+            for nickname, latency in data.get("agent_latency", {}).items():
+                logger.info(f"Agent {nickname} latency: {latency}")
+            if self.client.agent and self.game_mode == GameMode.AGENT:
+                logger.info(
+                    f"Your agent's latency: {self.client.agent.latency.summary()}"
+                )
+
         except Exception as e:
             logger.error(f"Error handling game over data: {e}")
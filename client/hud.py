@@ -0,0 +1,132 @@
+"""
+Performance overlay for the I Like Trains client
+Shows the frame times and the health of the connection to the server
+"""
+
+import time
+
+import pygame
+
+
+# How often the displayed statistics are refreshed, and pings sent to the server
+REFRESH_INTERVAL_SECONDS = 1.0
+
+# Order in which the renderer stages are displayed
+STAGES = ["background", "passengers", "trains", "leaderboard", "changes", "present"]
+
+
+class Hud:
+    """
+    Overlay toggled with F3. The renderer reports the duration of each of its
+    stages, the network manager counts the packets received and the gaps in
+    the state sequence numbers, and every second the averages are computed and
+    a ping is sent to measure the round-trip time. The frames are not measured
+    while the overlay is hidden.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.visible = False
+        self.lines = []  # Text displayed, refreshed every REFRESH_INTERVAL_SECONDS
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.period_start = time.time()
+        self.nb_frames = 0
+        self.frame_time = 0.0
+        self.stage_times = {}  # {stage: total duration over the period}
+        network = self.client.network
+        self.period_start_packets = network.nb_packets_received
+        self.period_start_bytes = network.nb_bytes_received
+
+    def toggle(self):
+        """Show or hide the overlay"""
+        self.visible = not self.visible
+        if self.visible:
+            self.lines = ["Measuring..."]
+            self.reset_counters()
+            self.client.network.send_rtt_ping()
+        else:
+            # The overlay was drawn over the game, which has to be drawn again
+            self.client.renderer.needs_full_redraw = True
+
+    def record_stage(self, stage, duration):
+        """Add the duration in seconds of a renderer stage to the current frame"""
+        if self.visible:
+            self.stage_times[stage] = self.stage_times.get(stage, 0.0) + duration
+
+    def record_frame(self, duration):
+        """Count a frame which took the given duration in seconds to draw"""
+        if not self.visible:
+            return
+        self.nb_frames += 1
+        self.frame_time += duration
+
+        elapsed = time.time() - self.period_start
+        if elapsed >= REFRESH_INTERVAL_SECONDS:
+            self.refresh(elapsed)
+            self.reset_counters()
+            self.client.network.send_rtt_ping()
+
+    def refresh(self, elapsed):
+        """Compute the statistics of the last period"""
+        network = self.client.network
+        nb_frames = max(self.nb_frames, 1)
+        packets = network.nb_packets_received - self.period_start_packets
+        nb_bytes = network.nb_bytes_received - self.period_start_bytes
+        state_age = self.client.game_state.get_state_age()
+
+        self.lines = [
+            f"FPS: {self.nb_frames / elapsed:.0f}  frame: {self.frame_time / nb_frames * 1000:.2f} ms",
+        ]
+        for stage in STAGES:
+            if stage in self.stage_times:
+                self.lines.append(
+                    f"  {stage}: {self.stage_times[stage] / nb_frames * 1000:.2f} ms"
+                )
+        self.lines.append(
+            "RTT: "
+            + (f"{network.rtt * 1000:.1f} ms" if network.rtt is not None else "-")
+        )
+        self.lines.append(
+            f"Received: {packets / elapsed:.0f} packets/s, {nb_bytes / elapsed / 1024:.1f} KB/s"
+        )
+        # Since the start of the game, lost deltas are rare with acknowledged states
+        self.lines.append(
+            f"State gaps: {network.nb_state_gaps} ({network.nb_states_lost} lost), late: {network.nb_states_late}"
+        )
+        self.lines.append(
+            "State age: "
+            + (f"{state_age * 1000:.0f} ms" if state_age is not None else "-")
+        )
+
+    def get_texts(self):
+        text_cache = self.client.renderer.text_cache
+        return [text_cache.render(line, 20, (255, 255, 255)) for line in self.lines]
+
+    def get_rect(self):
+        """Return the area covered by the overlay, or None if it is hidden"""
+        if not self.visible:
+            return None
+        texts = self.get_texts()
+        width = max(text.get_width() for text in texts) + 10
+        height = sum(text.get_height() for text in texts) + 10
+        return pygame.Rect(0, 0, width, height)
+
+    def draw(self, surface):
+        """Draw the overlay in the top left corner of the surface"""
+        if not self.visible:
+            return
+
+        texts = self.get_texts()
+        rect = self.get_rect()
+
+        # Semi-transparent background so that the game stays visible
+        background = pygame.Surface(rect.size, pygame.SRCALPHA)
+        background.fill((0, 0, 0, 180))
+        surface.blit(background, (0, 0))
+
+        y = 5
+        for text in texts:
+            surface.blit(text, (5, y))
+            y += text.get_height()
@@ -18,6 +18,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger("client.network")
 
+# Minimum time between two keyframe requests, a keyframe repairs every loss
+# before it
+KEYFRAME_REQUEST_INTERVAL_SECONDS = 1.0
+
+# How often the last state received is acknowledged, when no other message
+# carries the ack. The server sends the changes since the acknowledged state.
+ACK_INTERVAL_SECONDS = 0.25
+
 
 class NetworkManager:
     """Class responsible for client network communications"""
@@ -30,7 +38,22 @@ class NetworkManager:
         self.socket = None
         self.running = True
         self.receive_thread = None
-        self.last_ping_time = 0
+        self.last_receive_time = 0  # Any packet from the server proves it is alive
+        self.last_keepalive_time = 0  # When we last pinged a quiet server
+        self.last_state_seq = None  # Acknowledged in the messages we send
+        self.last_keyframe_request_time = 0
+        self.last_acked_seq = None  # Last state seq sent in an ack
+        self.last_ack_time = 0
+        self.session_token = None  # Lets us resume our session from another address
+
+        # Statistics displayed by the HUD
+        self.nb_packets_received = 0
+        self.nb_bytes_received = 0
+        self.nb_state_gaps = 0  # Times deltas were lost and a keyframe was needed
+        self.nb_states_lost = 0  # States missing in those gaps
+        self.nb_states_late = 0  # Deltas older than the state we had, dropped
+        self.rtt = None  # Round-trip time of the last ping we sent, in seconds
+        self.rtt_ping_time = None  # When the ping we wait an answer for was sent
 
     def connect(self):
         """Establish connection with server"""
@@ -48,7 +71,7 @@ class NetworkManager:
             local_ip, local_port = self.socket.getsockname()
             logger.info(f"Successfully connected to server at {self.host}:{self.port} from local {local_ip}:{local_port}")
 
-            self.last_ping_time = time.time()
+            self.last_receive_time = time.time()
 
             # Start receive thread
             self.receive_thread = threading.Thread(target=self.receive_game_state)
@@ -101,6 +124,13 @@ class NetworkManager:
             return False
 
         try:
+            # Acknowledge the last state received, the server doesn't need to
+            # ping clients which send messages
+            if self.last_state_seq is not None:
+                message = dict(message, ack=self.last_state_seq)
+                self.last_acked_seq = self.last_state_seq
+                self.last_ack_time = time.time()
+
             # Serialize message to JSON and send to server address
             serialized = json.dumps(message) + "\n"
             bytes_sent = self.socket.sendto(serialized.encode(), self.server_addr)
@@ -134,25 +164,52 @@ class NetworkManager:
                 # Définir un timeout pour permettre de vérifier self.running périodiquement
                 self.socket.settimeout(0.5)
 
-                # Vérifier si on a reçu un ping récemment
+                # Vérifier si on a reçu un paquet récemment
                 current_time = time.time()
-                if (
-                    current_time - self.last_ping_time
-                    > self.client.config.server_timeout_seconds
-                ):
+                silence = current_time - self.last_receive_time
+                if silence > self.client.config.server_timeout_seconds:
                     logger.warning(
-                        f"Server hasn't sent a ping for {self.client.config.server_timeout_seconds} seconds, disconnecting"
+                        f"Server hasn't sent anything for {self.client.config.server_timeout_seconds} seconds, disconnecting"
                     )
                     # Déconnecter le client
                     self.disconnect(stop_client=True)
                     break
 
+                # The server only pings idle clients, ping it if it is quiet
+                if (
+                    silence > self.client.config.server_timeout_seconds / 2
+                    and current_time - self.last_keepalive_time
+                    > self.client.config.server_timeout_seconds / 4
+                ):
+                    self.last_keepalive_time = current_time
+                    # Our address may have changed, the token lets the server
+                    # find our session again
+                    ping = {"type": "ping"}
+                    if self.session_token:
+                        ping["session_token"] = self.session_token
+                    self.send_message(ping)
+
+                # Let the server know which states we received, so that it
+                # stops sending the changes they hold
+                if (
+                    self.last_state_seq is not None
+                    and self.last_state_seq != self.last_acked_seq
+                    and current_time - self.last_ack_time >= ACK_INTERVAL_SECONDS
+                ):
+                    self.send_message({"type": "ack"})
+
                 # Pour UDP, on utilise recvfrom qui retourne les données et l'adresse
-                data, addr = self.socket.recvfrom(4096)
+                # Keyframes hold the whole world, allow the largest datagrams
+                data, addr = self.socket.recvfrom(65535)
 
                 if not data:
                     continue
 
+                self.last_receive_time = time.time()
+
+                self.nb_packets_received += 1
+                self.nb_bytes_received += len(data)
+
                 # Add data to buffer
                 buffer += data.decode("utf-8")
 
@@ -180,7 +237,7 @@ class NetworkManager:
                                     message_type = message_data["type"]
 
                                     if message_type == "state":
-                                        self.client.handle_state_data(message_data["data"])
+                                        self.handle_state_message(message_data)
 
                                     elif message_type == "spawn_success":
                                         self.client.agent.is_dead = False
@@ -193,17 +250,44 @@ class NetworkManager:
                                     elif message_type == "ping":
                                         # Respond to ping with pong
                                         self.send_message({"type": "pong"})
-                                        self.last_ping_time = time.time()
 
                                     elif message_type == "pong":
                                         # Mark that we received a response to our ping
                                         self.client.ping_response_received = True
+                                        if self.rtt_ping_time is not None:
+                                            self.rtt = time.time() - self.rtt_ping_time
+                                            self.rtt_ping_time = None
 
                                     elif message_type == "game_status":
                                         self.client.handle_game_status(message_data)
 
                                     elif message_type == "join_success":
                                         logger.debug("Received join success response")
+                                        self.session_token = message_data.get(
+                                            "data", {}
+                                        ).get("session_token")
+
+                                    elif message_type == "resume_required":
+                                        # The server doesn't know our address anymore
+                                        if self.session_token:
+                                            logger.info(
+                                                "Resuming session from a new address"
+                                            )
+                                            self.send_message(
+                                                {
+                                                    "type": "resume",
+                                                    "session_token": self.session_token,
+                                                }
+                                            )
+                                        else:
+                                            logger.warning(
+                                                "Server doesn't know us and we have no session to resume"
+                                            )
+                                            self.disconnect(stop_client=True)
+                                            return
+
+                                    elif message_type == "resume_success":
+                                        logger.info("Session resumed")
 
                                     elif message_type == "drop_wagon_success":
                                         self.client.handle_drop_wagon_success(message_data)
@@ -361,6 +445,54 @@ class NetworkManager:
             logger.error(f"Error verifying connection: {e}")
             return False
 
+    def handle_state_message(self, message_data):
+        """
+        Pass a state message to the client, checking its sequence number. A
+        keyframe replaces the client's world. A delta older than the state
+        we have is dropped, and a gap in the sequence numbers means deltas
+        were lost, in which case a keyframe is requested.
+        """
+        seq = message_data.get("seq")
+        if message_data.get("keyframe"):
+            self.last_state_seq = seq
+            self.client.handle_state_data(message_data["data"], keyframe=True)
+            return
+
+        # Renames are sent outside of the sequence
+        if seq is not None:
+            if self.last_state_seq is None:
+                # The keyframe sent when the game started was lost
+                self.request_keyframe()
+            elif seq <= self.last_state_seq:
+                self.nb_states_late += 1
+                return
+            elif message_data.get("first_seq", seq) > self.last_state_seq + 1:
+                first_seq = message_data.get("first_seq", seq)
+                logger.debug(
+                    f"Lost state deltas {self.last_state_seq + 1} to {first_seq - 1}"
+                )
+                self.nb_state_gaps += 1
+                self.nb_states_lost += first_seq - self.last_state_seq - 1
+                self.request_keyframe()
+            self.last_state_seq = seq
+        self.client.handle_state_data(message_data["data"])
+
+    def request_keyframe(self):
+        """Ask the server for the complete game state, at most once per KEYFRAME_REQUEST_INTERVAL_SECONDS"""
+        current_time = time.time()
+        if (
+            current_time - self.last_keyframe_request_time
+            < KEYFRAME_REQUEST_INTERVAL_SECONDS
+        ):
+            return False
+        self.last_keyframe_request_time = current_time
+        return self.send_message({"action": "keyframe"})
+
+    def send_rtt_ping(self):
+        """Send a ping to the server to measure the round-trip time"""
+        self.rtt_ping_time = time.time()
+        return self.send_message({"type": "ping"})
+
     def send_agent_ids(self, nickname, agent_sciper, game_mode):
         """Send agent name and sciper to server"""
         message = {
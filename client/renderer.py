@@ -2,10 +2,12 @@
 Graphics rendering module for the I Like Trains client
 """
 
+import collections
 import pygame
 import logging
 import time
 
+from client.text_cache import TextCache
 from common.move import Move
 
 # Configure logger
@@ -21,6 +23,31 @@ class Renderer:
         self.sorted_trains = []
         # TODO(alok): delete self.manual_spawn, use self.client.config.manual_spawn instead
         self.manual_spawn = self.client.config.manual_spawn
+        # Fonts and rendered text are reused between frames
+        self.text_cache = TextCache()
+        # Static part of the game, rebuilt only when it changes
+        self.background = None
+        self.background_key = None
+
+        # Pre-rendered train and wagon cells, {(kind, cell_size, color, direction): (sprite, offset)}
+        self.cell_sprites = {}
+
+        # Time at which the trains are drawn when they are interpolated
+        self.render_time = None
+
+        # Leaderboard panel and its rows, rebuilt only when the trains change
+        self.leaderboard_surface = None
+        self.leaderboard_key = None
+        self.leaderboard_rows = {}  # {row: Surface}, see get_leaderboard_row
+        self.leaderboard_bottom = 0
+
+        # What is currently on screen, used by the dirty-rect mode
+        self.needs_full_redraw = True
+        self.drawn_background = None
+        self.drawn_time_text = None
+        self.drawn_hud_rect = None
+        self.drawn_items = {}  # {owner: {item: rect}}, owner being a nickname or None for passengers
+        self.cell_index = collections.defaultdict(set)  # {(col, row): {(owner, item)}}
 
     def draw_game(self):
         """Draws the game."""
@@ -29,92 +56,78 @@ class Renderer:
             logger.error("Cannot draw game: pygame not initialized or screen is None")
             return
 
+        frame_start = time.perf_counter()
         try:
-            # Fill screen with background color (white)
-            self.client.screen.fill((255, 255, 255))
+            render_changes = self.client.game_state.pop_render_changes()
+            if render_changes[2]:
+                self.leaderboard_surface = None
+
+            # With interpolation, trains are drawn a little in the past and
+            # keep moving between states
+            timeline = self.client.game_state.timeline
+            if timeline:
+                self.render_time = timeline.get_render_time(time.time())
+                render_changes = (
+                    render_changes[0] | set(self.client.trains),
+                ) + render_changes[1:]
 
             # If in waiting room, display waiting screen
             if self.client.in_waiting_room:
+                self.client.screen.fill((255, 255, 255))
                 self.draw_waiting_room()
                 # Update display
-                pygame.display.flip()
+                self.client.present()
+                self.needs_full_redraw = True
                 return
 
             # If game is over, display game over screen
             if self.client.game_over:
+                self.client.screen.fill((255, 255, 255))
                 self.draw_game_over_screen()
                 # Update display
-                pygame.display.flip()
+                self.client.present()
+                self.needs_full_redraw = True
                 return
 
-            try:
-                # Draw a light grid across the full game area
-                grid_color = (230, 230, 230)  # Very light gray
-                outline_color = (200, 200, 200)  # Slightly darker gray for outlines
-                outline_width = 3  # Thicker width for outlines
-
-                # Draw inner grid lines only if cell_size is not zero
-                if self.client.cell_size > 0:
-                    for x in range(
-                        self.client.game_screen_padding,
-                        self.client.game_width + self.client.game_screen_padding,
-                        self.client.cell_size,
-                    ):
-                        pygame.draw.line(
-                            self.client.screen,
-                            grid_color,
-                            (x, self.client.game_screen_padding),
-                            (x, self.client.game_height + self.client.game_screen_padding),
-                            1,
-                        )
-                    for y in range(
-                        self.client.game_screen_padding,
-                        self.client.game_height + self.client.game_screen_padding,
-                        self.client.cell_size,
-                    ):
-                        pygame.draw.line(
-                            self.client.screen,
-                            grid_color,
-                            (self.client.game_screen_padding, y),
-                            (self.client.game_width + self.client.game_screen_padding, y),
-                            1,
-                        )
-
-                # Draw outer border with thicker lines
-                pygame.draw.rect(
-                    self.client.screen,
-                    outline_color,
-                    (
-                        self.client.game_screen_padding - outline_width,
-                        self.client.game_screen_padding - outline_width,
-                        self.client.game_width + 2 * outline_width,
-                        self.client.game_height + 2 * outline_width,
-                    ),
-                    outline_width,
-                )
-            except Exception as e:
-                logger.error("Error drawing grid: " + str(e))
+            hud = self.client.hud
+            agent_dead = self.client.agent and self.client.agent.is_dead
+            if (
+                self.client.config.dirty_rect_rendering
+                and not self.needs_full_redraw
+                and not agent_dead
+                and self.get_background() is self.drawn_background
+            ):
+                stage_start = time.perf_counter()
+                self.draw_changes(*render_changes)
+                self.record_stage("changes", stage_start)
+                return
 
+            stage_start = time.perf_counter()
             try:
-                self.draw_delivery_zone()
+                # The grid, its border and the delivery zone are pre-rendered
+                self.client.screen.blit(self.get_background(), (0, 0))
             except Exception as e:
-                logger.error("Error drawing delivery zone: " + str(e))
+                logger.error("Error drawing background: " + str(e))
+            stage_start = self.record_stage("background", stage_start)
 
             try:
                 self.draw_passengers()
             except Exception as e:
                 logger.error("Error drawing passengers: " + str(e))
+            stage_start = self.record_stage("passengers", stage_start)
 
             try:
                 self.draw_trains()
             except Exception as e:
                 logger.error("Error drawing trains: " + str(e))
+            stage_start = self.record_stage("trains", stage_start)
 
             try:
                 # Draw leaderboard on the right
                 self.draw_leaderboard()
             except Exception as e:
                 logger.error("Error drawing leaderboard: " + str(e))
+            stage_start = self.record_stage("leaderboard", stage_start)
 
             if self.client.agent:
                 if self.client.agent.is_dead and not self.client.in_waiting_room:
@@ -123,8 +136,18 @@ class Renderer:
                     except Exception as e:
                         logger.error("Error drawing death screen: " + str(e))
 
+            hud.draw(self.client.screen)
+            self.drawn_hud_rect = hud.get_rect()
+
             # Update display
-            pygame.display.flip()
+            stage_start = time.perf_counter()
+            self.client.present()
+            self.record_stage("present", stage_start)
+
+            if self.client.config.dirty_rect_rendering:
+                self.remember_drawn_frame()
+                # The death screen covers the game, draw everything once it's gone
+                self.needs_full_redraw = bool(agent_dead)
 
         except Exception as e:
             logger.error("Error drawing game: " + str(e))
@@ -132,7 +155,221 @@ class Renderer:
 
             logger.error(traceback.format_exc())
 
-    def draw_delivery_zone(self):
+        finally:
+            self.client.hud.record_frame(time.perf_counter() - frame_start)
+
+    def record_stage(self, stage, stage_start):
+        """Report the duration of a stage to the HUD, returns the start of the next stage"""
+        now = time.perf_counter()
+        self.client.hud.record_stage(stage, now - stage_start)
+        return now
+
+    def remember_drawn_frame(self):
+        """Record what the last full redraw put on screen"""
+        self.drawn_background = self.background
+        self.drawn_time_text = self.get_time_remaining_text()
+        self.drawn_items = {None: self.get_passenger_items()}
+        for nickname, train_data in self.client.trains.items():
+            self.drawn_items[nickname] = self.get_train_items(nickname, train_data)
+
+        self.cell_index.clear()
+        for owner, items in self.drawn_items.items():
+            for item, rect in items.items():
+                self.index_item(owner, item, rect)
+
+    def get_rect_cells(self, rect):
+        """Return the grid cells (col, row) overlapped by a screen rect"""
+        cell_size = self.client.cell_size
+        padding = self.client.game_screen_padding
+        first_col = (rect.left - padding) // cell_size
+        last_col = (rect.right - 1 - padding) // cell_size
+        first_row = (rect.top - padding) // cell_size
+        last_row = (rect.bottom - 1 - padding) // cell_size
+        return [
+            (col, row)
+            for col in range(first_col, last_col + 1)
+            for row in range(first_row, last_row + 1)
+        ]
+
+    def index_item(self, owner, item, rect):
+        for cell in self.get_rect_cells(rect):
+            self.cell_index[cell].add((owner, item))
+
+    def unindex_item(self, owner, item, rect):
+        for cell in self.get_rect_cells(rect):
+            self.cell_index[cell].discard((owner, item))
+            if not self.cell_index[cell]:
+                del self.cell_index[cell]
+
+    def draw_changes(self, changed_trains, passengers_changed, leaderboard_changed):
+        """
+        Redraw only what changed since the previous frame: erase the areas of
+        the items that moved or disappeared with the background, draw again
+        everything overlapping these areas, and update only these areas of the
+        display.
+        """
+        dirty_rects = []
+
+        # Find the items which appeared or disappeared
+        changed_owners = set(changed_trains)
+        if passengers_changed:
+            changed_owners.add(None)
+        for owner in changed_owners:
+            old_items = self.drawn_items.pop(owner, {})
+            if owner is None:
+                new_items = self.get_passenger_items()
+            elif owner in self.client.trains:
+                new_items = self.get_train_items(owner, self.client.trains[owner])
+            else:
+                new_items = {}
+            if new_items:
+                self.drawn_items[owner] = new_items
+
+            for item, rect in old_items.items():
+                if item not in new_items:
+                    self.unindex_item(owner, item, rect)
+                    dirty_rects.append(rect)
+            for item, rect in new_items.items():
+                if item not in old_items:
+                    self.index_item(owner, item, rect)
+                    dirty_rects.append(rect)
+
+        # The HUD is drawn over the game, the game below it is drawn again
+        # each frame before the HUD is drawn on top
+        hud_rect = self.client.hud.get_rect()
+        for rect in (self.drawn_hud_rect, hud_rect):
+            if rect is not None:
+                dirty_rects.append(rect)
+        self.drawn_hud_rect = hud_rect
+
+        # Everything overlapping an erased area has to be drawn again, which
+        # in turn erases what it overlaps
+        to_draw = set()
+        pending = list(dirty_rects)
+        while pending:
+            rect = pending.pop()
+            for cell in self.get_rect_cells(rect):
+                for owner, item in self.cell_index.get(cell, ()):
+                    item_rect = self.drawn_items[owner][item]
+                    if (owner, item) not in to_draw and item_rect.colliderect(rect):
+                        to_draw.add((owner, item))
+                        dirty_rects.append(item_rect)
+                        pending.append(item_rect)
+
+        for rect in dirty_rects:
+            self.client.screen.blit(self.drawn_background, rect, rect)
+
+        # Keep the drawing order of a full redraw: passengers, then the trains
+        self.draw_items(
+            [
+                item
+                for owner in [None] + list(self.client.trains)
+                for item in self.drawn_items.get(owner, {})
+                if (owner, item) in to_draw
+            ]
+        )
+
+        time_text = self.get_time_remaining_text()
+        if leaderboard_changed or time_text != self.drawn_time_text:
+            self.draw_leaderboard()
+            self.drawn_time_text = time_text
+            dirty_rects.append(
+                pygame.Rect(
+                    self.client.game_width + 2 * self.client.game_screen_padding - 1,
+                    0,
+                    self.client.leaderboard_width + 1,
+                    self.client.screen_height,
+                )
+            )
+
+        self.client.hud.draw(self.client.screen)
+
+        if dirty_rects:
+            self.client.present(dirty_rects)
+
+    def get_background(self):
+        """
+        Return the surface holding the static part of the game (grid, border
+        and delivery zone). It is only rebuilt when the screen size, the game
+        size, the cell size or the delivery zone change.
+        """
+        delivery_zone = self.client.delivery_zone
+        background_key = (
+            self.client.screen.get_size(),
+            self.client.game_width,
+            self.client.game_height,
+            self.client.cell_size,
+            self.client.game_screen_padding,
+            tuple(delivery_zone["position"]) if delivery_zone else None,
+            delivery_zone["width"] if delivery_zone else None,
+            delivery_zone["height"] if delivery_zone else None,
+        )
+        if self.background is None or background_key != self.background_key:
+            self.background = pygame.Surface(self.client.screen.get_size())
+            # Fill with background color (white)
+            self.background.fill((255, 255, 255))
+
+            try:
+                self.draw_grid(self.background)
+            except Exception as e:
+                logger.error("Error drawing grid: " + str(e))
+
+            try:
+                self.draw_delivery_zone(self.background)
+            except Exception as e:
+                logger.error("Error drawing delivery zone: " + str(e))
+
+            self.background_key = background_key
+
+        return self.background
+
+    def draw_grid(self, surface):
+        """Draw a light grid across the full game area, with a thicker border"""
+        grid_color = (230, 230, 230)  # Very light gray
+        outline_color = (200, 200, 200)  # Slightly darker gray for outlines
+        outline_width = 3  # Thicker width for outlines
+
+        # Draw inner grid lines only if cell_size is not zero
+        if self.client.cell_size > 0:
+            for x in range(
+                self.client.game_screen_padding,
+                self.client.game_width + self.client.game_screen_padding,
+                self.client.cell_size,
+            ):
+                pygame.draw.line(
+                    surface,
+                    grid_color,
+                    (x, self.client.game_screen_padding),
+                    (x, self.client.game_height + self.client.game_screen_padding),
+                    1,
+                )
+            for y in range(
+                self.client.game_screen_padding,
+                self.client.game_height + self.client.game_screen_padding,
+                self.client.cell_size,
+            ):
+                pygame.draw.line(
+                    surface,
+                    grid_color,
+                    (self.client.game_screen_padding, y),
+                    (self.client.game_width + self.client.game_screen_padding, y),
+                    1,
+                )
+
+        # Draw outer border with thicker lines
+        pygame.draw.rect(
+            surface,
+            outline_color,
+            (
+                self.client.game_screen_padding - outline_width,
+                self.client.game_screen_padding - outline_width,
+                self.client.game_width + 2 * outline_width,
+                self.client.game_height + 2 * outline_width,
+            ),
+            outline_width,
+        )
+
+    def draw_delivery_zone(self, surface):
         # Draw delivery zone
         delivery_zone = self.client.delivery_zone
         if delivery_zone:
@@ -146,13 +383,62 @@ class Renderer:
             )
             # Fill with semi-transparent red (fourth parameter is alpha, 128 = semi-transparent)
             s.fill((255, 0, 0, 128))
-            # Blit the surface onto the screen
-            self.client.screen.blit(s, (x, y))
+            # Blit the surface onto the background
+            surface.blit(s, (x, y))
 
     def draw_passengers(self):
         """
         Draw passengers and their values
         """
+        self.draw_items(self.get_passenger_items())
+
+    def draw_trains(self):
+        """
+        Draw trains and their wagons
+        """
+        blits = []
+        for nickname, train_data in self.client.trains.items():
+            blits.extend(self.get_train_blits(nickname, train_data))
+        self.client.screen.blits(blits, doreturn=False)
+
+    def draw_items(self, items):
+        """
+        Draw items in order. Trains and wagons are pre-rendered sprites, blitted
+        in batches so that the cost of a frame stays low with many wagons.
+        """
+        blits = []
+        for item in items:
+            if item[0] == "passenger":
+                # Keep the drawing order, flush the sprites before the passenger
+                if blits:
+                    self.client.screen.blits(blits, doreturn=False)
+                    blits = []
+                self.draw_item(item)
+            else:
+                kind, x, y = item[:3]
+                sprite, offset = self.get_cell_sprite(kind, *item[3:])
+                blits.append((sprite, (x + offset, y + offset)))
+        if blits:
+            self.client.screen.blits(blits, doreturn=False)
+
+    def get_cell_sprite(self, kind, color, direction=None):
+        """
+        Return the sprite of a train or wagon cell and its offset from the
+        cell's corner, rendering it on the first use.
+        """
+        key = (kind, self.client.cell_size, color, direction)
+        sprite = self.cell_sprites.get(key)
+        if sprite is None:
+            sprite = self.render_cell_sprite(kind, color, direction)
+            self.cell_sprites[key] = sprite
+        return sprite
+
+    def get_passenger_items(self):
+        """
+        Return the {item: rect} of the passengers. An item is a hashable tuple
+        describing exactly what is drawn, and rect the screen area it covers.
+        """
+        items = {}
         for passenger in self.client.passengers:
             try:
                 if isinstance(passenger, dict):
@@ -170,30 +456,15 @@ class Renderer:
                     logger.warning("Unrecognized passenger format: " + str(passenger))
                     continue
 
-                # Calculate color intensity based on value (1-10)
-                # Higher value = more intense red
-                red_intensity = max(
-                    100, min(255, 100 + (155 * value / 10))
-                )  # Range from 100-255
-
-                # Draw a circle to represent passengers
-                pygame.draw.circle(
-                    self.client.screen,
-                    (red_intensity, 0, 0),  # Red with varying intensity
-                    (
-                        x + self.client.cell_size // 2,
-                        y + self.client.cell_size // 2,
-                    ),  # Circle center
-                    self.client.cell_size // 2 - 2,  # Circle radius slightly smaller
-                )
-
-                # Draw the value text above the passenger
-                font = pygame.font.Font(None, 24)  # Default pygame font, size 24
-                text = font.render(str(value), True, (0, 0, 0))  # Black text
+                # The passenger's cell plus the value text above it
+                text = self.text_cache.render(str(value), 24, (0, 0, 0))
                 text_rect = text.get_rect(
                     center=(x + self.client.cell_size // 2, y - 5)
-                )  # Position above passenger
-                self.client.screen.blit(text, text_rect)
+                )
+                rect = pygame.Rect(
+                    x, y, self.client.cell_size, self.client.cell_size
+                ).union(text_rect)
+                items[("passenger", x, y, value)] = rect
 
             except Exception as e:
                 logger.error(
@@ -202,87 +473,151 @@ class Renderer:
                     + ", passenger: "
                     + str(passenger)
                 )
+        return items
 
-    def draw_trains(self):
+    def get_train_cells(self, nickname, train_data):
         """
-        Draw trains and their wagons
+        Return (head, wagon_color, wagons) for a train, head being
+        (x, y, color, direction) and wagons the screen positions of the
+        wagons, or None if the train is not drawn.
         """
-        for nickname, train_data in self.client.trains.items():
-            # Only draw if train is alive
-            if isinstance(train_data, dict) and not train_data.get("alive", True):
-                continue
-
-            # Check if train data is in new format (dictionary)
-            train_position = train_data.get("position", (0, 0))
-            train_x, train_y = train_position
-            train_x += self.client.game_screen_padding
-            train_y += self.client.game_screen_padding
-            train_wagons = train_data.get("wagons", [])
-            train_direction = train_data.get("direction", Move.RIGHT)
-            train_color = train_data.get("color", (0, 255, 0))
-            train_wagon_color = tuple(
-                min(c + 50, 255) for c in train_color
-            )  # Wagons lighter
-
-            # Draw main train
-            color = train_color
-            if self.client.agent:
-                if nickname == self.client.nickname:
-                    color = (0, 0, 255)  # Blue for player's train
-            # Draw train with more elaborate shape
-            pygame.draw.rect(
-                self.client.screen,
-                color,
-                pygame.Rect(
-                    train_x + 1,
-                    train_y + 1,
-                    self.client.cell_size - 2,
-                    self.client.cell_size - 2,
-                ),
+        # Only draw if train is alive
+        if isinstance(train_data, dict) and not train_data.get("alive", True):
+            return None
+
+        # Check if train data is in new format (dictionary)
+        train_position = train_data.get("position", (0, 0))
+        train_wagons = train_data.get("wagons", [])
+
+        timeline = self.client.game_state.timeline
+        if timeline:
+            positions = timeline.get_positions(
+                nickname, self.render_time, self.client.cell_size
+            )
+            if positions is not None:
+                train_position, train_wagons = positions
+
+        padding = self.client.game_screen_padding
+        train_x, train_y = train_position
+        train_x += padding
+        train_y += padding
+        train_direction = tuple(train_data.get("direction", Move.RIGHT.value))
+        train_color = tuple(train_data.get("color", (0, 255, 0)))
+        train_wagon_color = tuple(
+            min(c + 50, 255) for c in train_color
+        )  # Wagons lighter
+
+        # Draw main train
+        color = train_color
+        wagon_color = train_wagon_color
+        if self.client.agent:
+            if nickname == self.client.nickname:
+                color = (0, 0, 255)  # Blue for player's train
+                wagon_color = (50, 50, 200)  # Darker blue for player's wagons
+
+        wagons = [
+            (wagon_x + padding, wagon_y + padding) for wagon_x, wagon_y in train_wagons
+        ]
+        return (train_x, train_y, color, train_direction), wagon_color, wagons
+
+    def get_train_items(self, nickname, train_data):
+        """Return the {item: rect} of a train (see get_passenger_items)"""
+        items = {}
+        cells = self.get_train_cells(nickname, train_data)
+        if cells is None:
+            return items
+
+        head, wagon_color, wagons = cells
+        cell_size = self.client.cell_size
+        items[("train",) + head] = pygame.Rect(head[0], head[1], cell_size, cell_size)
+
+        # Draw wagons
+        for wagon_x, wagon_y in wagons:
+            items[("wagon", wagon_x, wagon_y, wagon_color)] = pygame.Rect(
+                wagon_x, wagon_y, cell_size, cell_size
             )
 
-            # Add train details (like "eyes")
-            if train_direction[0] == 1:  # Right
-                eye_x = train_x + 3 * self.client.cell_size // 4
-                eye_y = train_y + self.client.cell_size // 4
-            elif train_direction[0] == -1:  # Left
-                eye_x = train_x + self.client.cell_size // 4
-                eye_y = train_y + self.client.cell_size // 4
-            elif train_direction[1] == 1:  # Down
-                eye_x = train_x + self.client.cell_size // 4
-                eye_y = train_y + 3 * self.client.cell_size // 4
-            else:  # Up
-                eye_x = train_x + self.client.cell_size // 4
-                eye_y = train_y + self.client.cell_size // 4
-
-            # Draw train's "eyes"
+        return items
+
+    def get_train_blits(self, nickname, train_data):
+        """Return the (sprite, position) to blit to draw a train and its wagons"""
+        cells = self.get_train_cells(nickname, train_data)
+        if cells is None:
+            return []
+
+        (x, y, color, direction), wagon_color, wagons = cells
+        sprite, offset = self.get_cell_sprite("train", color, direction)
+        blits = [(sprite, (x + offset, y + offset))]
+
+        # The sprite of the wagons is the same for the whole train
+        sprite, offset = self.get_cell_sprite("wagon", wagon_color)
+        blits.extend(
+            [
+                (sprite, (wagon_x + offset, wagon_y + offset))
+                for wagon_x, wagon_y in wagons
+            ]
+        )
+        return blits
+
+    def render_cell_sprite(self, kind, color, direction):
+        """Render what draw_item draws for a train or wagon on a sprite"""
+        cell_size = self.client.cell_size
+        if kind == "wagon":
+            sprite = pygame.Surface((cell_size - 4, cell_size - 4))
+            sprite.fill(color)
+            return sprite, 2
+
+        # The sprite starts at the corner of the train's rect, 1 pixel in the cell
+        sprite = pygame.Surface((cell_size - 2, cell_size - 2))
+        sprite.fill(color)
+        eye_x, eye_y = self.get_eye_position(0, 0, direction)
+        pygame.draw.circle(
+            sprite, (255, 255, 255), (eye_x - 1, eye_y - 1), cell_size // 8
+        )
+        return sprite, 1
+
+    def get_eye_position(self, x, y, train_direction):
+        """Return the position of the "eyes" of a train in the cell at (x, y)"""
+        cell_size = self.client.cell_size
+        if train_direction[0] == 1:  # Right
+            return x + 3 * cell_size // 4, y + cell_size // 4
+        elif train_direction[0] == -1:  # Left
+            return x + cell_size // 4, y + cell_size // 4
+        elif train_direction[1] == 1:  # Down
+            return x + cell_size // 4, y + 3 * cell_size // 4
+        else:  # Up
+            return x + cell_size // 4, y + cell_size // 4
+
+    def draw_item(self, item):
+        """
+        Draw an item returned by get_passenger_items. Trains and wagons are
+        sprites, drawn by draw_items.
+        """
+        kind, x, y = item[:3]
+        cell_size = self.client.cell_size
+
+        if kind == "passenger":
+            value = item[3]
+            # Calculate color intensity based on value (1-10)
+            # Higher value = more intense red
+            red_intensity = max(
+                100, min(255, 100 + (155 * value / 10))
+            )  # Range from 100-255
+
+            # Draw a circle to represent passengers
             pygame.draw.circle(
                 self.client.screen,
-                (255, 255, 255),  # White
-                (eye_x, eye_y),
-                self.client.cell_size // 8,
+                (red_intensity, 0, 0),  # Red with varying intensity
+                (x + cell_size // 2, y + cell_size // 2),  # Circle center
+                cell_size // 2 - 2,  # Circle radius slightly smaller
             )
 
-            # Draw wagons
-            for wagon_pos in train_wagons:
-                wagon_x, wagon_y = wagon_pos
-                wagon_x += self.client.game_screen_padding
-                wagon_y += self.client.game_screen_padding
-                wagon_color = train_wagon_color
-                if self.client.agent:
-                    if nickname == self.client.nickname:
-                        wagon_color = (50, 50, 200)  # Darker blue for player's wagons
-
-                pygame.draw.rect(
-                    self.client.screen,
-                    wagon_color,
-                    pygame.Rect(
-                        wagon_x + 2,
-                        wagon_y + 2,
-                        self.client.cell_size - 4,
-                        self.client.cell_size - 4,
-                    ),
-                )
+            # Draw the value text above the passenger
+            text = self.text_cache.render(str(value), 24, (0, 0, 0))  # Black text
+            text_rect = text.get_rect(
+                center=(x + cell_size // 2, y - 5)
+            )  # Position above passenger
+            self.client.screen.blit(text, text_rect)
 
     def draw_waiting_room(self):
         """Display the waiting room screen"""
@@ -298,8 +633,7 @@ class Renderer:
             self.client.screen.fill((240, 240, 255))  # Very light blue
 
             # Waiting room title
-            font_title = pygame.font.Font(None, 48)
-            title = font_title.render("Waiting for players...", True, (0, 0, 100))
+            title = self.text_cache.render("Waiting for players...", 48, (0, 0, 100))
             rect_size = title.get_size()
             title_rect = title.get_rect(
                 center=(rect_size[0] // 2 + 20, rect_size[1] // 2 + 20)
@@ -309,15 +643,14 @@ class Renderer:
             # Display waiting room information if available
             if self.client.waiting_room_data and self.client.in_waiting_room:
                 # Display players in room
-                font = pygame.font.Font(None, 32)
                 players = self.client.waiting_room_data.get("players", [])
 
                 # Display player count and maximum
                 nb_players = self.client.waiting_room_data.get("nb_players", 0)
                 players_count = len(players)
-                count_text = font.render(
+                count_text = self.text_cache.render(
                     "Players: " + str(players_count) + "/" + str(nb_players),
-                    True,
+                    32,
                     (0, 0, 100),
                 )
                 self.client.screen.blit(count_text, (50, 80))
@@ -325,9 +658,9 @@ class Renderer:
                 # Display waiting time if available
                 waiting_time = self.client.waiting_room_data.get("waiting_time", None)
                 if waiting_time is not None and waiting_time > 0:
-                    time_text = font.render(
+                    time_text = self.text_cache.render(
                         f"Starting in: {waiting_time} seconds",
-                        True,
+                        32,
                         (200, 0, 0),  # Red color for emphasis
                     )
                     self.client.screen.blit(time_text, (50, 110))
@@ -336,15 +669,15 @@ class Renderer:
                     and waiting_time == 0
                     and players_count < nb_players
                 ):
-                    time_text = font.render(
+                    time_text = self.text_cache.render(
                         "Adding bots and starting game...",
-                        True,
+                        32,
                         (200, 0, 0),  # Red color for emphasis
                     )
                     self.client.screen.blit(time_text, (50, 110))
 
                 # Player list title
-                players_title = font.render("Players:", True, (0, 0, 100))
+                players_title = self.text_cache.render("Players:", 32, (0, 0, 100))
                 self.client.screen.blit(
                     players_title, (50, 150)
                 )  # Moved down to make room for waiting time
@@ -361,13 +694,14 @@ class Renderer:
                     x = 20 + (column * column_width)
                     y = start_y + (row * 40)
 
-                    player_text = font.render(
-                        str(i + 1) + ". " + str(player), True, (0, 0, 0)
+                    player_text = self.text_cache.render(
+                        str(i + 1) + ". " + str(player), 32, (0, 0, 0)
                     )
                     self.client.screen.blit(player_text, (x, y))
             else:
-                font = pygame.font.Font(None, 32)
-                message = font.render("Waiting for server data...", True, (0, 0, 100))
+                message = self.text_cache.render(
+                    "Waiting for server data...", 32, (0, 0, 100)
+                )
                 message_rect = message.get_rect(
                     center=(
                         self.client.screen_width // 2,
@@ -377,7 +711,7 @@ class Renderer:
                 self.client.screen.blit(message, message_rect)
 
             # Update display
-            pygame.display.flip()
+            self.client.present()
         except Exception as e:
             logger.error("Error drawing waiting room: " + str(e))
 
@@ -389,10 +723,9 @@ class Renderer:
 
         if remaining_time > 0:
             # Display cooldown
-            font = pygame.font.Font(None, 28)
-            text = font.render(
+            text = self.text_cache.render(
                 "Respawn in " + str(int(remaining_time) + 1) + " seconds",
-                True,
+                28,
                 (255, 0, 0),
             )
             text_rect = text.get_rect(
@@ -405,8 +738,7 @@ class Renderer:
 
         elif self.client.agent.waiting_for_respawn and self.manual_spawn:
             # Display respawn message in center of screen
-            font = pygame.font.Font(None, 28)
-            text = font.render("Press SPACE to spawn", True, (0, 200, 0))
+            text = self.text_cache.render("Press SPACE to spawn", 28, (0, 200, 0))
             text_rect = text.get_rect(
                 center=(
                     self.client.game_screen_padding + self.client.game_width // 2,
@@ -418,278 +750,240 @@ class Renderer:
     def draw_leaderboard(self):
         """Draw the leaderboard with train scores"""
         try:
-            # Define leaderboard area
-            leaderboard_rect = pygame.Rect(
-                self.client.game_width + 2 * self.client.game_screen_padding,
-                0,
-                self.client.leaderboard_width,
-                self.client.screen_height,
-            )
-
-            # Draw leaderboard background
-            pygame.draw.rect(self.client.screen, (240, 240, 240), leaderboard_rect)
+            x = self.client.game_width + 2 * self.client.game_screen_padding
 
-            # Draw a line to separate leaderboard from game area
+            # Draw a line to separate leaderboard from game area. The part of
+            # the line inside the leaderboard is covered by the panel below.
             pygame.draw.line(
                 self.client.screen,
                 (100, 100, 100),
-                (self.client.game_width + 2 * self.client.game_screen_padding, 0),
-                (
-                    self.client.game_width + 2 * self.client.game_screen_padding,
-                    self.client.screen_height,
-                ),
-                2,
-            )
-
-            # Add a title with colored background
-            title_rect = pygame.Rect(
-                self.client.game_width + 2 * self.client.game_screen_padding,
-                0,
-                self.client.leaderboard_width,
-                40,
-            )
-            pygame.draw.rect(self.client.screen, (50, 50, 150), title_rect)
-
-            font_title = pygame.font.Font(None, 28)
-            title = font_title.render("LEADERBOARD", True, (255, 255, 255))
-            title_rect = title.get_rect(
-                center=(
-                    self.client.game_width
-                    + self.client.leaderboard_width // 2
-                    + 2 * self.client.game_screen_padding,
-                    20,
-                )
-            )
-            self.client.screen.blit(title, title_rect)
-
-            # Add a header
-            header_font = pygame.font.Font(None, 24)
-            header_y = 50
-
-            # Draw columns with distinct titles
-            rank_header = header_font.render("Rank", True, (0, 0, 100))
-            self.client.screen.blit(
-                rank_header,
-                (
-                    self.client.game_width + 2 * self.client.game_screen_padding + 10,
-                    header_y,
-                ),
-            )
-
-            player_header = header_font.render("Player", True, (0, 0, 100))
-            self.client.screen.blit(
-                player_header,
-                (
-                    self.client.game_width + 2 * self.client.game_screen_padding + 70,
-                    header_y,
-                ),
-            )
-
-            score_header = header_font.render("Score", True, (0, 0, 100))
-            self.client.screen.blit(
-                score_header,
-                (
-                    self.client.game_width + 2 * self.client.game_screen_padding + 170,
-                    header_y,
-                ),
-            )
-
-            best_score_header = header_font.render("Best", True, (0, 0, 100))
-            self.client.screen.blit(
-                best_score_header,
-                (
-                    self.client.game_width + 2 * self.client.game_screen_padding + 230,
-                    header_y,
-                ),
-            )
-
-            # Add a line to separate header from player list
-            pygame.draw.line(
-                self.client.screen,
-                (200, 200, 200),
-                (
-                    self.client.game_width + 2 * self.client.game_screen_padding + 5,
-                    header_y + 20,
-                ),
-                (
-                    self.client.game_width
-                    + 2 * self.client.game_screen_padding
-                    + self.client.leaderboard_width
-                    - 5,
-                    header_y + 20,
-                ),
+                (x, 0),
+                (x, self.client.screen_height),
                 2,
             )
 
-            if len(self.sorted_trains) != len(self.client.trains):
-                self.sorted_trains = []
-
-            # Get train data for leaderboard
-            for nickname, train_data in self.client.trains.items():
-                # Check if train is already in sorted_trains
-                train_found = False
-                current_score = train_data.get("score", 0)  # Get current score
-                for i, (existing_name, best_score, _) in enumerate(self.sorted_trains):
-                    if existing_name == nickname:
-                        # Update best score if current score is higher
-                        if current_score > best_score:
-                            self.sorted_trains[i] = (
-                                nickname,
-                                current_score,
-                                current_score,
-                            )
-                        else:
-                            self.sorted_trains[i] = (
-                                nickname,
-                                best_score,
-                                current_score,
-                            )
-                        train_found = True
-                        break
-
-                # If train not found, add it
-                if not train_found:
-                    self.sorted_trains.append(
-                        (nickname, current_score, current_score)
-                    )
-
-            # Sort by best score in descending order
-            self.sorted_trains.sort(key=lambda x: x[1], reverse=True)
-
-            # Display players in leaderboard
-            player_font = pygame.font.Font(None, 22)
-            y_offset = header_y + 30
-
-            for i, (nickname, best_score, current_score) in enumerate(
-                self.sorted_trains
-            ):
-                # Limit to 10 players in leaderboard
-                # if i >= 10:
-                #     break
-
-                # Determine color based on rank
-                if i == 0:
-                    rank_color = (218, 165, 32)  # Gold
-                elif i == 1:
-                    rank_color = (192, 192, 192)  # Silver
-                elif i == 2:
-                    rank_color = (205, 127, 50)  # Bronze
-                else:
-                    rank_color = (100, 100, 100)  # Gray
-
-                # Highlight current player's row
-                if self.client.agent:
-                    if nickname == self.client.nickname:
-                        pygame.draw.rect(
-                            self.client.screen,
-                            (220, 220, 255),  # Light blue background
-                            pygame.Rect(
-                                self.client.game_width
-                            + 2 * self.client.game_screen_padding
-                            + 5,
-                            y_offset - 2,
-                            self.client.leaderboard_width - 10,
-                            20,
-                        ),
-                    )
-
-                # Get train color
-                train_color = (0, 0, 0)  # Default color
-                if nickname in self.client.trains:
-                    train_data = self.client.trains[nickname]
-                    if isinstance(train_data, dict) and "color" in train_data:
-                        train_color = train_data["color"]
-                    if self.client.agent:
-                        if nickname == self.client.nickname:
-                            train_color = (0, 0, 255)  # Blue for player's train
-
-                # Display rank
-                rank_text = player_font.render(str(i + 1), True, rank_color)
-                self.client.screen.blit(
-                    rank_text,
-                    (
-                        self.client.game_width
-                        + 2 * self.client.game_screen_padding
-                        + 30,
-                        y_offset,
-                    ),
-                )
-
-                # Display player name with train color
-                name_text = player_font.render(nickname[:10], True, train_color)
-                self.client.screen.blit(
-                    name_text,
-                    (
-                        self.client.game_width
-                        + 2 * self.client.game_screen_padding
-                        + 60,
-                        y_offset,
-                    ),
-                )
-
-                # Display current score
-                score_text = player_font.render(str(current_score), True, (0, 0, 0))
-                self.client.screen.blit(
-                    score_text,
-                    (
-                        self.client.game_width
-                        + 2 * self.client.game_screen_padding
-                        + 185,
-                        y_offset,
-                    ),
-                )
-
-                # Display best score
-                best_score_text = player_font.render(str(best_score), True, (0, 0, 0))
-                self.client.screen.blit(
-                    best_score_text,
-                    (
-                        self.client.game_width
-                        + 2 * self.client.game_screen_padding
-                        + 240,
-                        y_offset,
-                    ),
-                )
-
-                y_offset += 25
+            # The panel is only rendered again when the trains changed
+            self.client.screen.blit(self.get_leaderboard_surface(), (x, 0))
 
             # Draw remaining time below the leaderboard
-            if hasattr(self.client, "game_start_time") and hasattr(
-                self.client, "game_life_time"
-            ):
-                # Calculate remaining time
-                elapsed = time.time() - self.client.game_start_time
-                remaining = max(0, self.client.game_life_time - elapsed)
-
-                # Format time as mm:ss
-                minutes = int(remaining) // 60
-                seconds = int(remaining) % 60
-                time_text = f"Time remaining: {minutes:02d}:{seconds:02d}"
-
+            time_text = self.get_time_remaining_text()
+            if time_text is not None:
                 # Draw time with a background
                 time_rect = pygame.Rect(
-                    self.client.game_width + 2 * self.client.game_screen_padding + 5,
-                    y_offset + 10,
+                    x + 5,
+                    self.leaderboard_bottom + 10,
                     self.client.leaderboard_width - 10,
                     30,
                 )
                 pygame.draw.rect(self.client.screen, (50, 50, 150), time_rect)
 
                 # Draw time text
-                time_font = pygame.font.Font(None, 24)
-                time_surface = time_font.render(time_text, True, (255, 255, 255))
+                time_surface = self.text_cache.render(time_text, 24, (255, 255, 255))
                 time_text_rect = time_surface.get_rect(
                     center=(
-                        self.client.game_width
-                        + 2 * self.client.game_screen_padding
-                        + self.client.leaderboard_width // 2,
-                        y_offset + 25,
+                        x + self.client.leaderboard_width // 2,
+                        self.leaderboard_bottom + 25,
                     )
                 )
                 self.client.screen.blit(time_surface, time_text_rect)
         except Exception as e:
             logger.error("Error drawing leaderboard: " + str(e))
 
+    def get_leaderboard_surface(self):
+        """
+        Return the leaderboard panel (title, header and one row per train),
+        without the remaining time. It is rebuilt only when it was invalidated
+        by a change of the trains or when the panel size changed.
+        """
+        leaderboard_key = (self.client.leaderboard_width, self.client.screen_height)
+        if (
+            self.leaderboard_surface is not None
+            and leaderboard_key == self.leaderboard_key
+        ):
+            return self.leaderboard_surface
+
+        surface = pygame.Surface(leaderboard_key)
+
+        # Draw leaderboard background
+        surface.fill((240, 240, 240))
+
+        # The separation line overlaps the left edge of the panel
+        pygame.draw.line(
+            surface, (100, 100, 100), (0, 0), (0, self.client.screen_height), 2
+        )
+
+        # Add a title with colored background
+        title_rect = pygame.Rect(0, 0, self.client.leaderboard_width, 40)
+        pygame.draw.rect(surface, (50, 50, 150), title_rect)
+
+        title = self.text_cache.render("LEADERBOARD", 28, (255, 255, 255))
+        title_rect = title.get_rect(center=(self.client.leaderboard_width // 2, 20))
+        surface.blit(title, title_rect)
+
+        # Add a header
+        header_y = 50
+
+        # Draw columns with distinct titles
+        rank_header = self.text_cache.render("Rank", 24, (0, 0, 100))
+        surface.blit(rank_header, (10, header_y))
+
+        player_header = self.text_cache.render("Player", 24, (0, 0, 100))
+        surface.blit(player_header, (70, header_y))
+
+        score_header = self.text_cache.render("Score", 24, (0, 0, 100))
+        surface.blit(score_header, (170, header_y))
+
+        best_score_header = self.text_cache.render("Best", 24, (0, 0, 100))
+        surface.blit(best_score_header, (230, header_y))
+
+        # Add a line to separate header from player list
+        pygame.draw.line(
+            surface,
+            (200, 200, 200),
+            (5, header_y + 20),
+            (self.client.leaderboard_width - 5, header_y + 20),
+            2,
+        )
+
+        self.update_sorted_trains()
+
+        # Display players in leaderboard
+        y_offset = header_y + 30
+        row_surfaces = {}
+        for i, (nickname, best_score, current_score) in enumerate(self.sorted_trains):
+            row = self.get_leaderboard_row(i, nickname, best_score, current_score)
+            row_surfaces[row] = self.leaderboard_rows.get(row)
+            if row_surfaces[row] is None:
+                row_surfaces[row] = self.draw_leaderboard_row(*row)
+            surface.blit(row_surfaces[row], (0, y_offset - 2))
+            y_offset += 25
+
+        # Rows which are not displayed anymore are dropped
+        self.leaderboard_rows = row_surfaces
+        self.leaderboard_bottom = y_offset
+        self.leaderboard_surface = surface
+        self.leaderboard_key = leaderboard_key
+        return surface
+
+    def update_sorted_trains(self):
+        """Update the (nickname, best score, current score) of the trains, sorted by best score"""
+        if len(self.sorted_trains) != len(self.client.trains):
+            self.sorted_trains = []
+
+        # Get train data for leaderboard
+        for nickname, train_data in self.client.trains.items():
+            # Check if train is already in sorted_trains
+            train_found = False
+            current_score = train_data.get("score", 0)  # Get current score
+            for i, (existing_name, best_score, _) in enumerate(self.sorted_trains):
+                if existing_name == nickname:
+                    # Update best score if current score is higher
+                    if current_score > best_score:
+                        self.sorted_trains[i] = (
+                            nickname,
+                            current_score,
+                            current_score,
+                        )
+                    else:
+                        self.sorted_trains[i] = (
+                            nickname,
+                            best_score,
+                            current_score,
+                        )
+                    train_found = True
+                    break
+
+            # If train not found, add it
+            if not train_found:
+                self.sorted_trains.append((nickname, current_score, current_score))
+
+        # Sort by best score in descending order
+        self.sorted_trains.sort(key=lambda x: x[1], reverse=True)
+
+    def get_leaderboard_row(self, rank, nickname, best_score, current_score):
+        """Return everything a leaderboard row depends on, used as its cache key"""
+        # Highlight current player's row
+        is_player = bool(self.client.agent) and nickname == self.client.nickname
+
+        # Get train color
+        train_color = (0, 0, 0)  # Default color
+        if nickname in self.client.trains:
+            train_data = self.client.trains[nickname]
+            if isinstance(train_data, dict) and "color" in train_data:
+                train_color = train_data["color"]
+            if is_player:
+                train_color = (0, 0, 255)  # Blue for player's train
+
+        return (
+            rank,
+            nickname,
+            best_score,
+            current_score,
+            tuple(train_color),
+            is_player,
+        )
+
+    def draw_leaderboard_row(
+        self, rank, nickname, best_score, current_score, train_color, is_player
+    ):
+        """Render a leaderboard row on its own surface, starting 2 pixels above the text"""
+        surface = pygame.Surface((self.client.leaderboard_width, 25))
+        surface.fill((240, 240, 240))
+
+        # Determine color based on rank
+        if rank == 0:
+            rank_color = (218, 165, 32)  # Gold
+        elif rank == 1:
+            rank_color = (192, 192, 192)  # Silver
+        elif rank == 2:
+            rank_color = (205, 127, 50)  # Bronze
+        else:
+            rank_color = (100, 100, 100)  # Gray
+
+        if is_player:
+            pygame.draw.rect(
+                surface,
+                (220, 220, 255),  # Light blue background
+                pygame.Rect(5, 0, self.client.leaderboard_width - 10, 20),
+            )
+
+        # The separation line overlaps the left edge of each row too
+        pygame.draw.line(surface, (100, 100, 100), (0, 0), (0, 25), 2)
+
+        # Display rank
+        rank_text = self.text_cache.render(str(rank + 1), 22, rank_color)
+        surface.blit(rank_text, (30, 2))
+
+        # Display player name with train color
+        name_text = self.text_cache.render(nickname[:10], 22, train_color)
+        surface.blit(name_text, (60, 2))
+
+        # Display current score
+        score_text = self.text_cache.render(str(current_score), 22, (0, 0, 0))
+        surface.blit(score_text, (185, 2))
+
+        # Display best score
+        best_score_text = self.text_cache.render(str(best_score), 22, (0, 0, 0))
+        surface.blit(best_score_text, (240, 2))
+
+        return surface
+
+    def get_time_remaining_text(self):
+        """Return the remaining time of the game formatted as mm:ss"""
+        if not hasattr(self.client, "game_start_time") or not hasattr(
+            self.client, "game_life_time"
+        ):
+            return None
+
+        # Calculate remaining time
+        elapsed = time.time() - self.client.game_start_time
+        remaining = max(0, self.client.game_life_time - elapsed)
+
+        # Format time as mm:ss
+        minutes = int(remaining) // 60
+        seconds = int(remaining) % 60
+        return f"Time remaining: {minutes:02d}:{seconds:02d}"
+
     def draw_game_over_screen(self):
         """Display the game over screen with final scores"""
         try:
@@ -701,35 +995,32 @@ class Renderer:
             self.client.screen.blit(overlay, (0, 0))
 
             # Draw message
-            font_message = pygame.font.Font(None, 36)
             if self.client.game_over_data:
                 message = self.client.game_over_data.get(
                     "message", "Time limit reached."
                 )
             else:
                 message = "Time limit reached."
-            message_text = font_message.render(message, True, (0, 0, 0))
+            message_text = self.text_cache.render(message, 36, (0, 0, 0))
             message_rect = message_text.get_rect(
                 center=(self.client.screen_width // 2, 70)
             )
             self.client.screen.blit(message_text, message_rect)
 
             # Draw final scores title
-            font_scores_title = pygame.font.Font(None, 48)
-            scores_title = font_scores_title.render("Final Scores", True, (0, 0, 0))
+            scores_title = self.text_cache.render("Final Scores", 48, (0, 0, 0))
             scores_title_rect = scores_title.get_rect(
                 center=(self.client.screen_width // 2, 120)
             )
             self.client.screen.blit(scores_title, scores_title_rect)
 
             # Draw scores table
-            font_scores = pygame.font.Font(None, 32)
             y_offset = 170
 
             # Draw table headers
-            header_rank = font_scores.render("Rank", True, (0, 0, 0))
-            header_name = font_scores.render("Player", True, (0, 0, 0))
-            header_score = font_scores.render("Best scores", True, (0, 0, 0))
+            header_rank = self.text_cache.render("Rank", 32, (0, 0, 0))
+            header_name = self.text_cache.render("Player", 32, (0, 0, 0))
+            header_score = self.text_cache.render("Best scores", 32, (0, 0, 0))
 
             # Calculate positions for centered table
             table_width = 400
@@ -804,22 +1095,21 @@ class Renderer:
                         rank_color = (255, 255, 255)
 
                 # Draw rank
-                rank_text = font_scores.render(f"#{i + 1}", True, rank_color)
+                rank_text = self.text_cache.render(f"#{i + 1}", 32, rank_color)
                 self.client.screen.blit(rank_text, (col1_x, y_offset))
 
                 # Draw name
-                name_text = font_scores.render(player_name, True, rank_color)
+                name_text = self.text_cache.render(player_name, 32, rank_color)
                 self.client.screen.blit(name_text, (col2_x, y_offset))
 
                 # Draw score
-                score_text = font_scores.render(str(player_score), True, rank_color)
+                score_text = self.text_cache.render(str(player_score), 32, rank_color)
                 self.client.screen.blit(score_text, (col3_x + 50, y_offset))
 
                 y_offset += 40
 
             # Draw message to exit
-            font_exit = pygame.font.Font(None, 28)
-            exit_text = font_exit.render("Press ESC to exit", True, (200, 200, 200))
+            exit_text = self.text_cache.render("Press ESC to exit", 28, (200, 200, 200))
             exit_rect = exit_text.get_rect(
                 center=(self.client.screen_width // 2, y_offset + 50)
             )
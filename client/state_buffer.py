@@ -0,0 +1,75 @@
+"""
+State buffer for the game "I Like Trains"
+Coalesces the state updates received from the server until they are consumed
+"""
+
+import threading
+import time
+
+from common.state_delta import merge_state_delta
+
+
+class StateBuffer:
+    """
+    Mailbox between the network receive thread and the consumer of the game
+    state (the main loop, or the agent worker without a window, see
+    GameState.update). The receive thread pushes every state delta, which is
+    merged into a single pending delta. The consumer takes it at its own rate,
+    so a burst of packets is applied in one go instead of one packet at a
+    time. A keyframe drops everything pending, the deltas received
+    after it are merged into it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.renames = []  # [(old_name, new_name)] to apply before the pending delta
+        self.pending_receive_time = None
+        self.pending_keyframe = False  # Whether the pending delta is a whole world
+        self.nb_received = 0
+        self.nb_coalesced = 0  # Deltas merged into an already pending one
+
+    def push(self, data, keyframe=False):
+        """Merge a state delta received from the server into the pending one"""
+        with self.lock:
+            if self.pending or self.renames:
+                self.nb_coalesced += 1
+            self.nb_received += 1
+            self.pending_receive_time = time.time()
+
+            if keyframe:
+                self.pending = {}
+                self.renames = []
+                self.pending_keyframe = True
+
+            # Renames change the keys of the trains, they can't simply be merged
+            if "rename_train" in data:
+                old_name, new_name = data["rename_train"]
+                self.renames.append((old_name, new_name))
+                trains = self.pending.get("trains", {})
+                if old_name in trains:
+                    trains[new_name] = trains.pop(old_name)
+                data = {
+                    key: value for key, value in data.items() if key != "rename_train"
+                }
+
+            merge_state_delta(self.pending, data)
+
+    def pop(self):
+        """
+        Take the pending renames and delta. Returns (renames, delta, receive_time,
+        keyframe), receive_time being when the newest merged delta was received
+        and keyframe whether the delta replaces the whole world.
+        """
+        with self.lock:
+            renames, delta, receive_time, keyframe = (
+                self.renames,
+                self.pending,
+                self.pending_receive_time,
+                self.pending_keyframe,
+            )
+            self.renames = []
+            self.pending = {}
+            self.pending_receive_time = None
+            self.pending_keyframe = False
+        return renames, delta, receive_time, keyframe
@@ -0,0 +1,53 @@
+"""
+Text cache for the I Like Trains client
+Keeps the fonts and the rendered text surfaces between frames
+"""
+
+import collections
+
+import pygame
+
+
+# Maximum number of rendered text surfaces kept in the cache
+MAX_TEXT_SURFACES = 512
+
+
+class TextCache:
+    """
+    Caches fonts by size and rendered text surfaces by (text, size, color).
+    Creating a font and rendering text are the most expensive operations of a
+    frame, while most of the text drawn does not change between frames. The
+    least recently used surfaces are evicted once the cache is full.
+    """
+
+    def __init__(self, max_surfaces=MAX_TEXT_SURFACES):
+        self.max_surfaces = max_surfaces
+        self.fonts = {}  # {size: pygame.font.Font}
+        self.surfaces = collections.OrderedDict()  # {(text, size, color): Surface}
+
+    def get_font(self, size):
+        """Return the default pygame font at the given size"""
+        font = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.Font(None, size)
+            self.fonts[size] = font
+        return font
+
+    def render(self, text, size, color):
+        """Return an antialiased surface of the text, rendering it on a cache miss"""
+        key = (text, size, tuple(color))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = self.get_font(size).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_surfaces:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        """Drop every cached font and surface, e.g. after pygame was re-initialized"""
+        self.fonts.clear()
+        self.surfaces.clear()
@@ -0,0 +1,124 @@
+"""
+Train timeline for the I Like Trains client
+Keeps the recent positions of the trains to draw them between server states
+"""
+
+import collections
+import threading
+
+
+# Number of states kept per train
+MAX_SAMPLES = 32
+
+# A train moving more cells than this between two states teleported (respawn),
+# it is not interpolated
+MAX_INTERPOLATED_CELLS = 3
+
+
+class TrainTimeline:
+    """
+    Buffers the positions of the trains with the time they were received, and
+    returns where each train should be drawn at a given render time. The render
+    time is a little in the past (interpolation delay) so that it usually falls
+    between two received states, and the train is drawn part way between them.
+    When no newer state has arrived yet, the last movement is continued for at
+    most max_extrapolation seconds.
+    """
+
+    def __init__(self, interpolation_delay, max_extrapolation):
+        self.interpolation_delay = interpolation_delay
+        self.max_extrapolation = max_extrapolation
+        self.lock = threading.Lock()
+        # {nickname: deque of (receive_time, position, wagons)}
+        self.samples = {}
+
+    def record(self, trains, nicknames, receive_time):
+        """Record the current positions of the given trains"""
+        with self.lock:
+            for nickname in nicknames:
+                train_data = trains.get(nickname)
+                if train_data is None or not train_data.get("alive", True):
+                    # Dead trains start from scratch when they respawn
+                    self.samples.pop(nickname, None)
+                    continue
+
+                position = tuple(train_data.get("position", (0, 0)))
+                wagons = [tuple(wagon) for wagon in train_data.get("wagons", [])]
+                samples = self.samples.setdefault(
+                    nickname, collections.deque(maxlen=MAX_SAMPLES)
+                )
+                if samples and samples[-1][1:] == (position, wagons):
+                    continue
+                samples.append((receive_time, position, wagons))
+
+    def rename(self, old_name, new_name):
+        with self.lock:
+            if old_name in self.samples:
+                self.samples[new_name] = self.samples.pop(old_name)
+
+    def get_render_time(self, now):
+        return now - self.interpolation_delay
+
+    def get_positions(self, nickname, render_time, cell_size):
+        """
+        Return the (position, wagons) at which the train should be drawn at
+        render_time, or None if its positions are unknown.
+        """
+        with self.lock:
+            samples = list(self.samples.get(nickname, ()))
+        if not samples:
+            return None
+
+        # Before the oldest state, nothing better than the oldest position
+        if render_time <= samples[0][0]:
+            return samples[0][1], samples[0][2]
+
+        for previous, current in zip(samples, samples[1:]):
+            if render_time < current[0]:
+                fraction = (render_time - previous[0]) / (current[0] - previous[0])
+                return self.interpolate(previous, current, fraction, cell_size)
+
+        # After the newest state, continue the last movement for a while
+        current = samples[-1]
+        if len(samples) < 2 or not self.max_extrapolation:
+            return current[1], current[2]
+        previous = samples[-2]
+        duration = current[0] - previous[0]
+        extrapolated = min(render_time - current[0], self.max_extrapolation)
+        # Never guess further than the next state
+        fraction = 1 + min(extrapolated / duration, 1) if duration > 0 else 1
+        return self.interpolate(previous, current, fraction, cell_size)
+
+    def interpolate(self, previous, current, fraction, cell_size):
+        """Return the positions at a fraction of the way from previous to current"""
+        _, previous_position, previous_wagons = previous
+        _, position, wagons = current
+
+        max_distance = MAX_INTERPOLATED_CELLS * cell_size
+        if (
+            abs(position[0] - previous_position[0]) > max_distance
+            or abs(position[1] - previous_position[1]) > max_distance
+        ):
+            # Jump once the new state is reached
+            if fraction < 1:
+                return previous_position, previous_wagons
+            return position, wagons
+
+        def lerp(start, end):
+            return (
+                round(start[0] + (end[0] - start[0]) * fraction),
+                round(start[1] + (end[1] - start[1]) * fraction),
+            )
+
+        interpolated_wagons = []
+        for i, wagon in enumerate(wagons):
+            # A new wagon comes out of the last one of the previous state
+            if i < len(previous_wagons):
+                start = previous_wagons[i]
+            elif previous_wagons:
+                start = previous_wagons[-1]
+            else:
+                start = previous_position
+            interpolated_wagons.append(lerp(start, wagon))
+
+        return lerp(previous_position, position), interpolated_wagons
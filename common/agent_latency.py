@@ -0,0 +1,71 @@
+"""
+Decision latency tracking for the agents of the game "I Like Trains"
+"""
+
+import collections
+import math
+import threading
+
+
+# Number of recent decisions kept to compute the percentiles
+MAX_SAMPLES = 1000
+
+
+class AgentLatencyTracker:
+    """
+    Records how long an agent takes to return from get_move() and how often
+    it misses the deadline of its train's next move. Methods are thread-safe.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = collections.deque(maxlen=MAX_SAMPLES)  # Durations in seconds
+        self.nb_decisions = 0
+        self.max_duration = 0.0
+        self.nb_missed_deadlines = 0
+
+    def record(self, duration, deadline=None):
+        """
+        Record the duration of a decision. Returns True if the decision took
+        longer than the deadline (both in seconds).
+        """
+        missed = deadline is not None and duration > deadline
+        with self.lock:
+            self.samples.append(duration)
+            self.nb_decisions += 1
+            self.max_duration = max(self.max_duration, duration)
+            if missed:
+                self.nb_missed_deadlines += 1
+        return missed
+
+    def percentile(self, percent):
+        """Return the given percentile of the recent durations (nearest rank)"""
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        rank = max(1, math.ceil(percent / 100 * len(samples)))
+        return samples[rank - 1]
+
+    def summary(self):
+        """Return the latency statistics in milliseconds"""
+        return {
+            "decisions": self.nb_decisions,
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p99_ms": round(self.percentile(99) * 1000, 2),
+            "max_ms": round(self.max_duration * 1000, 2),
+            "missed_deadlines": self.nb_missed_deadlines,
+        }
+
+
+def get_move_deadline(speed, tick_rate=None):
+    """
+    Return the time in seconds until a train moving at the given speed moves
+    again. A train moves once every tick_rate / speed ticks (see Train.update),
+    so when the tick rate is known the deadline is rounded up to whole ticks.
+    """
+    if not speed:
+        return None
+    if tick_rate:
+        return math.ceil(tick_rate / speed) / tick_rate
+    return 1 / speed
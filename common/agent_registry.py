@@ -0,0 +1,194 @@
+"""
+Agent registry for the game "I Like Trains"
+Discovers, validates and caches the Agent classes found in common/agents
+"""
+
+import importlib
+import inspect
+import logging
+import os
+import threading
+import time
+
+from common.agents.base_agent import BaseAgent
+
+
+logger = logging.getLogger("common.agent_registry")
+
+AGENTS_PACKAGE = "common.agents"
+AGENTS_DIRECTORY = os.path.join(os.path.dirname(__file__), "agents")
+
+# Modules living in the agents folder which are not agents themselves
+NON_AGENT_MODULES = {"__init__", "base_agent"}
+
+# How often the watcher checks the agent files for modifications
+HOT_RELOAD_INTERVAL_SECONDS = 1.0
+
+
+def get_module_name(agent_file_name):
+    """Return the module name of an agent file, e.g. "agent.py" -> "agent" """
+    if agent_file_name.endswith(".py"):
+        return agent_file_name[:-3]
+    return agent_file_name
+
+
+class AgentRegistry:
+    """
+    Imports each agent module once and caches its Agent class, so that bots
+    can be instantiated without touching the import system. Errors are kept
+    per module so they can be reported when the server starts.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.agent_classes = {}  # {module_name: Agent class}
+        self.modules = {}  # {module_name: module}
+        self.mtimes = {}  # {module_name: modification time of the loaded file}
+        self.errors = {}  # {module_name: error message}
+        self.watcher_running = False
+        self.watcher_thread = None
+
+    def discover(self):
+        """Return the names of all the agent modules in the agents folder"""
+        module_names = []
+        for file_name in sorted(os.listdir(AGENTS_DIRECTORY)):
+            module_name = get_module_name(file_name)
+            if file_name.endswith(".py") and module_name not in NON_AGENT_MODULES:
+                module_names.append(module_name)
+        return module_names
+
+    def validate(self, module):
+        """Return the Agent class of a module, raise ImportError if it is not usable"""
+        agent_class = getattr(module, "Agent", None)
+        if not inspect.isclass(agent_class) or not issubclass(agent_class, BaseAgent):
+            raise ImportError(
+                f"{module.__name__} does not define an Agent class inheriting from BaseAgent"
+            )
+        if agent_class.get_move is BaseAgent.get_move:
+            raise ImportError(f"{module.__name__}.Agent does not implement get_move()")
+        return agent_class
+
+    def load(self, agent_file_name):
+        """Import and validate an agent module, then cache its Agent class"""
+        module_name = get_module_name(agent_file_name)
+        module_path = f"{AGENTS_PACKAGE}.{module_name}"
+        logger.info(f"Importing module: {module_path}")
+
+        try:
+            module = importlib.import_module(module_path)
+            agent_class = self.validate(module)
+        except Exception as e:
+            with self.lock:
+                self.errors[module_name] = str(e)
+            raise ImportError(f"Failed to load agent {module_name}: {e}") from e
+
+        with self.lock:
+            self.agent_classes[module_name] = agent_class
+            self.modules[module_name] = module
+            self.mtimes[module_name] = self.get_mtime(module)
+            self.errors.pop(module_name, None)
+        return agent_class
+
+    def get_mtime(self, module):
+        """Return the modification time of a module's file, None if unknown"""
+        try:
+            return os.path.getmtime(module.__file__)
+        except (OSError, TypeError):
+            return None
+
+    def reload_modified(self):
+        """
+        Reload the agent modules whose file changed since they were loaded.
+        The new Agent class is only swapped in if it passes validation,
+        otherwise the previous class stays in use. Returns the names of the
+        reloaded modules.
+        """
+        with self.lock:
+            loaded_modules = list(self.modules.items())
+
+        reloaded = []
+        for module_name, module in loaded_modules:
+            mtime = self.get_mtime(module)
+            if mtime is None or mtime == self.mtimes.get(module_name):
+                continue
+
+            try:
+                module = importlib.reload(module)
+                agent_class = self.validate(module)
+            except Exception as e:
+                # Remember the mtime so a broken file is only reported once
+                with self.lock:
+                    self.mtimes[module_name] = mtime
+                    self.errors[module_name] = str(e)
+                logger.error(
+                    f"Failed to reload agent {module_name}, keeping the previous version: {e}"
+                )
+                continue
+
+            with self.lock:
+                self.agent_classes[module_name] = agent_class
+                self.modules[module_name] = module
+                self.mtimes[module_name] = mtime
+                self.errors.pop(module_name, None)
+            logger.info(f"Reloaded agent {module_name}")
+            reloaded.append(module_name)
+
+        return reloaded
+
+    def start_watcher(self, interval=HOT_RELOAD_INTERVAL_SECONDS):
+        """Start a thread reloading the agent modules as soon as their file changes"""
+        if self.watcher_thread and self.watcher_thread.is_alive():
+            return
+
+        def watch():
+            while self.watcher_running:
+                try:
+                    self.reload_modified()
+                except Exception as e:
+                    logger.error(f"Error in agent watcher: {e}")
+                time.sleep(interval)
+
+        self.watcher_running = True
+        self.watcher_thread = threading.Thread(target=watch)
+        self.watcher_thread.daemon = True
+        self.watcher_thread.start()
+        logger.info("Watching agent files for modifications")
+
+    def stop_watcher(self):
+        """Stop the watcher thread"""
+        self.watcher_running = False
+
+    def preload(self, agent_file_names=()):
+        """
+        Load every discovered agent and the given agent files. Returns the
+        {module_name: error message} dictionary of the agents that failed.
+        """
+        module_names = self.discover()
+        for agent_file_name in agent_file_names:
+            module_name = get_module_name(agent_file_name)
+            if module_name not in module_names:
+                module_names.append(module_name)
+
+        for module_name in module_names:
+            try:
+                self.load(module_name)
+            except ImportError:
+                # Kept in self.errors, reported to the caller below
+                continue
+
+        logger.info(
+            f"Loaded {len(self.agent_classes)} agents: {', '.join(self.agent_classes)}"
+        )
+        return dict(self.errors)
+
+    def get(self, agent_file_name):
+        """Return the cached Agent class, loading it on a cache miss"""
+        with self.lock:
+            agent_class = self.agent_classes.get(get_module_name(agent_file_name))
+        if agent_class is None:
+            agent_class = self.load(agent_file_name)
+        return agent_class
+
+    def create_agent(self, agent_file_name, *args, **kwargs):
+        """Instantiate the Agent class of the given agent file"""
+        return self.get(agent_file_name)(*args, **kwargs)
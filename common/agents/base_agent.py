@@ -3,6 +3,7 @@ import time
 
 from client.network import NetworkManager
 from common import move
+from common.agent_latency import AgentLatencyTracker, get_move_deadline
 
 # Configure logging
 logging.basicConfig(
@@ -42,6 +43,8 @@ class BaseAgent:
             all_trains (dict): Dictionary of all trains in the game
             passengers (list): List of passengers in the game
             delivery_zone (list): List of delivery zones in the game
+            tick_rate (int): The server's tick rate, used to compute the move deadline
+            latency (AgentLatencyTracker): Statistics about the duration of get_move()
         """
         self.logger = logging.getLogger(logger)
         self.nickname = nickname
@@ -59,6 +62,10 @@ class BaseAgent:
         self.all_trains = None
         self.passengers = None
         self.delivery_zone = None
+        self.tick_rate = None
+
+        # Decision latency statistics, reported at the end of the game
+        self.latency = AgentLatencyTracker()
 
     def get_move(self):
         """
@@ -74,7 +81,10 @@ class BaseAgent:
         Returning from this method without doing anything will cause the train to continue moving forward.
         """
         if not self.is_dead:
+            start_time = time.perf_counter()
             new_direction = self.get_move()
+            self.record_decision_time(time.perf_counter() - start_time)
+
             if new_direction not in move.Move:
                 logging.error("get_move() did not return a valid move!")
                 return
@@ -85,3 +95,17 @@ class BaseAgent:
 
             if new_direction != self.all_trains[self.nickname]["direction"]:
                 self.network.send_direction_change(new_direction.value)
+
+    def record_decision_time(self, duration):
+        """
+        Record how long get_move() took. Not supposed to be modified.
+
+        A decision is late when it takes longer than the time until the train's
+        next move, which depends on the train's speed and the server's tick rate.
+        """
+        train = self.all_trains.get(self.nickname, {}) if self.all_trains else {}
+        deadline = get_move_deadline(train.get("speed"), self.tick_rate)
+        if self.latency.record(duration, deadline):
+            self.logger.debug(
+                f"get_move() took {duration * 1000:.1f} ms, missing the next move deadline of {deadline * 1000:.1f} ms"
+            )
@@ -36,6 +36,24 @@ class ClientConfig(BaseModel):
     # When game_mode is set to OBSERVER, the agents are.
     game_mode: GameMode = GameMode.MANUAL
 
+    # When True, only the parts of the screen which changed since the previous
+    # frame are redrawn. This uses much less CPU when observing large games.
+    dirty_rect_rendering: bool = False
+
+    # When True, trains move smoothly between the states received from the
+    # server instead of jumping from cell to cell. They are drawn
+    # interpolation_delay_seconds in the past, so that the position to draw
+    # usually lies between two received states. When no newer state arrived
+    # yet, the last movement is continued for at most max_extrapolation_seconds.
+    interpolate_trains: bool = False
+    interpolation_delay_seconds: float = 0.1
+    max_extrapolation_seconds: float = 0.0
+
+    # When True and game_mode is AGENT, the client runs without a window: pygame
+    # is never imported and only the networking and the agent run. Useful to run
+    # many agents on the same machine.
+    headless: bool = False
+
     # How long to wait before considering a server as disconnected.
     server_timeout_seconds: float = 2.0
 
@@ -28,6 +28,33 @@ class ServerConfig(BaseModel):
     # useful for debugging purpose.
     tick_rate: int = 60
 
+    # How many times per second the game state is sent to the clients. When it
+    # is lower than tick_rate, the changes of several ticks are merged into a
+    # single message.
+    broadcast_rate: int = 60
+
+    # If True, clients with a high round-trip time (measured with the pings)
+    # receive the state less often, at least min_broadcast_rate times per second.
+    adaptive_broadcast_rate: bool = False
+    min_broadcast_rate: int = 10
+
+    # Players are matched with players whose best score is in the same band of
+    # rating_band_size points, or in a neighbouring band.
+    rating_band_size: int = 50
+
+    # Clients joining within this many seconds of each other are assigned rooms
+    # in the same matchmaking pass.
+    matchmaking_batch_seconds: float = 0.05
+
+    # Number of rooms of finished games kept to be reused by the next games.
+    room_pool_size: int = 16
+
+    # Each client can send input_rate_limit direction and drop wagon inputs per
+    # second, in bursts of up to input_burst inputs. The inputs over the limit
+    # are dropped without being parsed.
+    input_rate_limit: float = 60.0
+    input_burst: int = 20
+
     # Duration of each game.
     game_duration_seconds: int = 300  # 300 seconds == 5 minutes
 
@@ -49,7 +76,11 @@ class ServerConfig(BaseModel):
     # Path to an agent file. Change this path to point to one of your agents
     # to use when creating bots (when game_mode is "manual" or "agent" and a client
     # disconnects).
-    ai_agent_file_name: str = "ai_agent.py"
+    ai_agent_file_name: str = "agent.py"
+
+    # If True, agent files are reloaded as soon as they are modified. New and
+    # respawned bots then use the new version without restarting the server.
+    hot_reload_agents: bool = False
 
     # Local agents configuration, add or remove agents you want to evaluate as needed
     agents: list[AgentConfig] = []
@@ -0,0 +1,20 @@
+"""
+Helpers to combine the state deltas sent by the server of the game "I Like Trains"
+"""
+
+
+def merge_state_delta(target, delta):
+    """
+    Merge a state delta (as returned by Game.get_state) into target, in place.
+    Trains are merged field by field, so a field changed in an older delta is
+    kept unless the newer delta changes it too. Every other key is replaced.
+    Returns target.
+    """
+    for key, value in delta.items():
+        if key == "trains":
+            trains = target.setdefault("trains", {})
+            for nickname, train_data in value.items():
+                trains.setdefault(nickname, {}).update(train_data)
+        else:
+            target[key] = value
+    return target
@@ -6,8 +6,6 @@ This module provides an AI client that can control trains on the server side
 import threading
 import time
 import logging
-from server.passenger import Passenger
-import sys
 import importlib
 
 
@@ -25,41 +23,34 @@ class AINetworkInterface:
         self.nickname = nickname
 
     def send_direction_change(self, direction):
-        """Change the direction of the train using the server's function"""
-        if self.nickname in self.room.game.trains and self.room.game.is_train_alive(
-            self.nickname
-        ):
-            self.room.game.trains[self.nickname].change_direction(direction)
+        """Change the direction of the train, at the next tick of the game"""
+        game = self.room.game
+        if game.is_train_alive(self.nickname):
+            game.submit_direction(self.nickname, direction)
             return True
         else:
             logger.warning(
-                f"Failed to change direction for train {self.nickname}. Train in room's trains: {self.nickname in self.room.game.trains}, is train alive: {self.room.game.is_train_alive(self.nickname)}"
+                f"Failed to change direction for train {self.nickname}. Train in room's trains: {self.nickname in game.trains}, is train alive: {game.is_train_alive(self.nickname)}"
             )
         return False
 
     def send_drop_wagon_request(self):
-        """Drop a wagon from the train using the server's function"""
-        if self.nickname in self.room.game.trains and self.room.game.is_train_alive(
-            self.nickname
-        ):
-            last_wagon_position = self.room.game.trains[self.nickname].drop_wagon()
-            if last_wagon_position:
-                # Create a new passenger at the position of the dropped wagon
-                new_passenger = Passenger(self.room.game)
-                new_passenger.position = last_wagon_position
-                new_passenger.value = 1
-                self.room.game.passengers.append(new_passenger)
-                self.room.game._dirty["passengers"] = True
-                return True
+        """Drop a wagon from the train, at the next tick of the game"""
+        game = self.room.game
+        if game.is_train_alive(self.nickname):
+            game.submit(lambda: game.drop_wagon(self.nickname))
+            return True
         return False
 
     def send_spawn_request(self):
-        """Request to spawn the train using the server's function"""
+        """Request to spawn the train, at the next tick of the game"""
         logger.debug(f"AI client {self.nickname} sending spawn request")
-        if self.nickname not in self.room.game.trains:
-            cooldown = self.room.game.get_train_cooldown(self.nickname)
+        game = self.room.game
+        if self.nickname not in game.trains:
+            cooldown = game.get_train_cooldown(self.nickname)
             if cooldown <= 0:
-                return self.room.game.add_train(self.nickname)
+                game.submit(lambda: game.add_train(self.nickname))
+                return True
         return False
 
 
@@ -75,6 +66,7 @@ class AIClient:
         self.game = room.game
         self.nickname = nickname  # The AI agent name
         self.nickname = nickname  # Use the AI name as the train name
+        self.agent_file_name = ai_agent_file_name
 
         # Create network interface
         self.network = AINetworkInterface(
@@ -84,18 +76,13 @@ class AIClient:
         # Initialize agent if path_to_agent is provided
         if nickname and ai_agent_file_name:
             try:
-                logger.info(f"Trying to import AI agent for {nickname}")
-                if ai_agent_file_name.endswith(".py"):
-                    # Remove .py extension
-                    ai_agent_file_name = ai_agent_file_name[:-3]
-
-                # Construct the module path correctly
-                module_path = f"common.agents.{ai_agent_file_name}"
-                logger.info(f"Importing module: {module_path}")
-
-                module = importlib.import_module(module_path)
-                self.agent = module.Agent(
-                    nickname, self.network, logger="server.ai_agent", is_dead=False
+                # Instantiate the agent from the class cached in the registry
+                self.agent = room.agent_registry.create_agent(
+                    ai_agent_file_name,
+                    nickname,
+                    self.network,
+                    logger="server.ai_agent",
+                    is_dead=False,
                 )
                 logger.info(
                     f"AI agent {nickname} initialized using {ai_agent_file_name}"
@@ -116,6 +103,7 @@ class AIClient:
                 raise e
 
         self.agent.delivery_zone = self.game.delivery_zone.to_dict()
+        self.agent.tick_rate = self.game.config.tick_rate
 
         # Start the AI thread
         self.running = True
@@ -126,11 +114,41 @@ class AIClient:
 
         self.update_state()
 
+    def refresh_agent(self):
+        """
+        Replace the agent with a new instance if its file was reloaded since
+        the agent was created, keeping the state the game set on the agent.
+        """
+        if not self.agent_file_name:
+            return
+
+        try:
+            agent_class = self.room.agent_registry.get(self.agent_file_name)
+        except ImportError as e:
+            logger.error(f"Failed to refresh AI agent for {self.nickname}: {e}")
+            return
+
+        if type(self.agent) is agent_class:
+            return
+
+        agent = agent_class(
+            self.nickname, self.network, logger="server.ai_agent", is_dead=False
+        )
+        agent.delivery_zone = self.agent.delivery_zone
+        agent.death_time = self.agent.death_time
+        agent.respawn_cooldown = self.agent.respawn_cooldown
+        agent.waiting_for_respawn = self.agent.waiting_for_respawn
+        agent.tick_rate = self.agent.tick_rate
+        agent.latency = self.agent.latency
+        self.agent = agent
+        logger.info(f"AI client {self.nickname} now uses the reloaded agent")
+
     def update_state(self):
         """Update the state from the game"""
         # Format trains in the expected format for the agent
         self.all_trains = {}
-        for name, train in self.game.trains.items():
+        # Copies, the game thread may add trains and passengers meanwhile
+        for name, train in list(self.game.trains.items()):
             self.all_trains[name] = {
                 "name": name,
                 "position": train.position,
@@ -138,11 +156,12 @@ class AIClient:
                 "wagons": train.wagons,
                 "score": train.score,
                 "alive": train.alive,
+                "speed": train.speed,
             }
 
         # Format passengers in the expected format for the agent
         self.passengers = []
-        for passenger in self.game.passengers:
+        for passenger in list(self.game.passengers):
             self.passengers.append(
                 {"position": passenger.position, "value": passenger.value}
             )
@@ -155,11 +174,17 @@ class AIClient:
 
     def run(self):
         """Main AI client loop"""
-        while self.running and self.room.running:
+        # The game thread runs the moves of the AI, there is nothing to do once it stopped
+        while self.running and self.room.running and self.game.running:
             # try:
             # Update the client state from the game
             self.update_state()
 
+            # The game thread adds or hands over the train of the AI at its next tick
+            if self.nickname not in self.all_trains:
+                time.sleep(0.1)
+                continue
+
             # Make sure the agent has access to the correct properties
             self.agent.all_trains = self.all_trains
             self.agent.passengers = self.passengers
@@ -171,7 +196,7 @@ class AIClient:
 
             # Add automatic respawn logic
             if (
-                not self.game.trains[self.nickname].alive
+                not self.all_trains[self.nickname]["alive"]
                 and self.agent.waiting_for_respawn
             ):
                 elapsed = time.time() - self.agent.death_time
@@ -194,7 +219,11 @@ class AIClient:
                     logger.debug(f"AI client {self.nickname} trying to spawn")
                     cooldown = self.room.game.get_train_cooldown(self.nickname)
                     if cooldown <= 0:
-                        self.room.game.add_train(self.nickname)
+                        # Pick up the latest version of the agent file
+                        self.refresh_agent()
+                        self.room.game.submit(
+                            lambda: self.room.game.add_train(self.nickname)
+                        )
                         self.agent.waiting_for_respawn = False
                         self.agent.is_dead = False
                         logger.info(f"AI client {self.nickname} respawned")
@@ -2,8 +2,8 @@
 Game class for the game "I Like Trains"
 """
 
+import collections
 import random
-import threading
 import time
 
 from common.server_config import ServerConfig
@@ -52,6 +52,11 @@ class Game:
     def __init__(self, config: ServerConfig, send_cooldown_notification, nb_players):
         self.config = config
         self.send_cooldown_notification = send_cooldown_notification
+        self.reset(nb_players)
+        logger.info(f"Game initialized with tick rate: {self.config.tick_rate}")
+
+    def reset(self, nb_players):
+        """Start over with an empty game, when its room is reused"""
         self.game_width = ORIGINAL_GAME_WIDTH
         self.game_height = ORIGINAL_GAME_HEIGHT
         self.new_game_width = self.game_width
@@ -68,11 +73,15 @@ class Game:
         self.passengers = []
         self.desired_passengers = 0
         self.dead_trains = {}  # {nickname: death_time}
-        self.lock = threading.Lock()
         self.last_update = time.time()
         self.game_started = False  # Track if game has started
         # Dictionary to track last delivery time for each train
         self.last_delivery_times = {}  # {nickname: last_delivery_time}
+        # Changes of the game from other threads, run by the game thread (see submit)
+        self.commands = collections.deque()
+        # Latest direction of each train since the previous tick (see submit_direction)
+        self.pending_directions = {}  # {nickname: direction}
+        self.nb_directions_coalesced = 0
         # Dirty flags for the game
         self._dirty = {
             "trains": True,
@@ -81,7 +90,6 @@ class Game:
             "passengers": True,
             "delivery_zone": True,
         }
-        logger.info(f"Game initialized with tick rate: {self.config.tick_rate}")
 
     def get_state(self):
         """Return game state with only modified data"""
@@ -102,12 +110,12 @@ class Game:
 
         # Add passengers if modified
         if self._dirty["passengers"]:
-            state["passengers"] = [p.to_dict() for p in self.passengers]
+            state["passengers"] = [p.to_dict() for p in list(self.passengers)]
             self._dirty["passengers"] = False
 
-        # Add modified trains
+        # Add modified trains. The game thread may add trains meanwhile
         trains_data = {}
-        for name, train in self.trains.items():
+        for name, train in list(self.trains.items()):
             train_data = train.to_dict()
             if train_data:  # Only add if data has changed
                 trains_data[name] = train_data
@@ -122,6 +130,62 @@ class Game:
 
         return state
 
+    def get_full_state(self):
+        """
+        Return the complete game state, for clients which can't rely on the
+        deltas they received. The dirty flags are left untouched.
+        """
+        state = {
+            "size": {
+                "game_width": self.game_width,
+                "game_height": self.game_height,
+            },
+            "cell_size": self.cell_size,
+            "passengers": [p.to_dict() for p in list(self.passengers)],
+            "trains": {
+                name: train.serialize() for name, train in list(self.trains.items())
+            },
+        }
+        if self.delivery_zone:
+            state["delivery_zone"] = self.delivery_zone.to_dict()
+        return state
+
+    def submit(self, command):
+        """
+        Queue a change of the game, a callable run by the game thread at the
+        start of its next tick. The trains and passengers are only changed by
+        the game thread, so the tick doesn't need a lock.
+        """
+        self.commands.append(command)
+
+    def submit_direction(self, nickname, direction):
+        """
+        Queue a direction change of a train. Only the latest direction of the
+        train is applied at the next tick, the ones it replaces are counted as
+        coalesced.
+        """
+        if nickname in self.pending_directions:
+            self.nb_directions_coalesced += 1
+        self.pending_directions[nickname] = direction
+
+    def run_commands(self):
+        """Run the commands and direction changes queued since the previous tick"""
+        # Commands queued while running are left to the next tick
+        for _ in range(len(self.commands)):
+            command = self.commands.popleft()
+            try:
+                command()
+            except Exception as e:
+                logger.error(f"Error in game command: {e}")
+
+        # After the commands, so that a train spawned this tick can turn
+        for nickname in list(self.pending_directions):
+            direction = self.pending_directions.pop(nickname)
+            try:
+                self.change_direction(nickname, direction)
+            except Exception as e:
+                logger.error(f"Error changing direction of train {nickname}: {e}")
+
     def run(self):
         while self.running:
             self.update()
@@ -310,6 +374,30 @@ class Game:
         """Check if a train is alive"""
         return nickname in self.trains and self.trains[nickname].alive
 
+    def change_direction(self, nickname, direction):
+        """Turn a train, if it is alive"""
+        if self.is_train_alive(nickname):
+            self.trains[nickname].change_direction(direction)
+            return True
+        return False
+
+    def drop_wagon(self, nickname):
+        """
+        Drop the last wagon of a train, which becomes a passenger worth 1.
+        Return the position of the wagon, or None if none was dropped.
+        """
+        if not self.is_train_alive(nickname):
+            return None
+        last_wagon_position = self.trains[nickname].drop_wagon()
+        if last_wagon_position:
+            # Create a new passenger at the position of the dropped wagon
+            new_passenger = Passenger(self)
+            new_passenger.position = last_wagon_position
+            new_passenger.value = 1
+            self.passengers.append(new_passenger)
+            self._dirty["passengers"] = True
+        return last_wagon_position
+
     def check_collisions(self):
         for _, train in self.trains.items():
             train.update(
@@ -355,10 +443,12 @@ class Game:
 
     def update(self):
         """Update game state"""
+        # Spawns are commands too, so they run before checking for trains
+        self.run_commands()
+
         if not self.trains:  # Update only if there are trains
             return
 
-        with self.lock:
-            # Update all trains and check for death conditions
-            # trains_to_remove = []
-            self.check_collisions()
+        # Update all trains and check for death conditions
+        # trains_to_remove = []
+        self.check_collisions()
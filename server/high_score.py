@@ -43,6 +43,11 @@ class HighScore:
         with self.lock:
             return copy.copy(self.scores)
 
+    def get_score(self, sciper):
+        """Returns the sciper's high score, 0 if it has none"""
+        with self.lock:
+            return self.scores.get(sciper, 0)
+
     def dump(self, limit=10):
         """
         Dumps the top limit high scores to the logger.
@@ -0,0 +1,170 @@
+"""
+Matchmaking for the server of the game "I Like Trains"
+Queues the clients joining and assigns them rooms of players with a similar rating
+"""
+
+import collections
+import logging
+import math
+import threading
+import time
+
+
+logger = logging.getLogger("server.matchmaking")
+
+# Number of recent queue wait times kept to compute the percentiles
+MAX_WAIT_SAMPLES = 1024
+
+
+class Matchmaker:
+    """
+    Clients joining are queued, and the matchmaking thread assigns them rooms
+    in batches. A client's rating is its best score (see HighScore), and
+    ratings are grouped in bands of rating_band_size points. The rooms open
+    to new players are indexed by band, so a client is assigned the oldest
+    open room of its band, or of a neighbouring band, without looking at the
+    other rooms. The rooms missing for a batch are created in the same pass.
+    Methods are thread-safe.
+    """
+
+    def __init__(
+        self, high_score, rating_band_size, batch_seconds, create_room, join_room
+    ):
+        self.high_score = high_score
+        self.rating_band_size = rating_band_size
+        self.batch_seconds = batch_seconds
+        self.create_room = create_room  # Returns a new Room
+        self.join_room = join_room  # Called with (addr, room) once a room is assigned
+
+        # Reentrant, the callbacks are called with the lock held
+        self.condition = threading.Condition(threading.RLock())
+        self.queue = collections.OrderedDict()  # {addr: (sciper, enqueue time)}
+        self.open_rooms = collections.defaultdict(
+            collections.OrderedDict
+        )  # {band: {room_id: Room}}
+        self.room_bands = {}  # {room_id: band}
+
+        # Queue wait time statistics
+        self.wait_samples = collections.deque(maxlen=MAX_WAIT_SAMPLES)  # Seconds
+        self.nb_matched = 0
+        self.max_wait = 0.0
+        self.nb_rooms_created = 0
+
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def get_band(self, sciper):
+        """Return the rating band of a player, new players are in band 0"""
+        return int(self.high_score.get_score(sciper) // self.rating_band_size)
+
+    def enqueue(self, addr, sciper):
+        """Queue a client until it is assigned a room"""
+        with self.condition:
+            self.queue[addr] = (sciper, time.time())
+            self.condition.notify()
+
+    def cancel(self, addr):
+        """Remove a client from the queue, e.g. when it disconnects"""
+        with self.condition:
+            self.queue.pop(addr, None)
+
+    def add_open_room(self, room, band=None):
+        """Index a room waiting for players, in its band unless another one is given"""
+        with self.condition:
+            if band is None:
+                band = self.room_bands.get(room.id, 0)
+            self.room_bands[room.id] = band
+            self.open_rooms[band][room.id] = room
+
+    def remove_room(self, room_id):
+        """Forget a room which was removed from the server"""
+        with self.condition:
+            band = self.room_bands.pop(room_id, None)
+            if band is not None:
+                self.open_rooms[band].pop(room_id, None)
+
+    def find_open_room(self, band):
+        """
+        Return the oldest room open to new players in the band, or in a
+        neighbouring one, or None. Rooms which filled up or started their game
+        are dropped from the index when they are met.
+        """
+        # The caller holds the lock
+        for candidate_band in (band, band - 1, band + 1):
+            rooms = self.open_rooms.get(candidate_band)
+            while rooms:
+                room = next(iter(rooms.values()))
+                if room.is_full() or room.game_thread:
+                    rooms.popitem(last=False)
+                    continue
+                return room
+        return None
+
+    def run(self):
+        """Thread that assigns rooms to the queued clients"""
+        while self.running:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait(timeout=1.0)
+            if not self.running:
+                break
+            # Let the clients joining at the same time queue up
+            time.sleep(self.batch_seconds)
+            try:
+                self.match_queued_clients()
+            except Exception as e:
+                logger.error(f"Error in matchmaking: {e}")
+
+    def match_queued_clients(self):
+        """Assign a room to every queued client, in the order they joined"""
+        current_time = time.time()
+        nb_created = 0
+        with self.condition:
+            batch = list(self.queue.items())
+            self.queue.clear()
+
+            for addr, (sciper, enqueue_time) in batch:
+                band = self.get_band(sciper)
+                room = self.find_open_room(band)
+                if room is None:
+                    room = self.create_room()
+                    nb_created += 1
+                    self.room_bands[room.id] = band
+                    self.open_rooms[band][room.id] = room
+                self.join_room(addr, room)
+
+                wait = current_time - enqueue_time
+                self.wait_samples.append(wait)
+                self.nb_matched += 1
+                self.max_wait = max(self.max_wait, wait)
+            self.nb_rooms_created += nb_created
+
+        logger.debug(
+            f"Matched {len(batch)} clients, created {nb_created} rooms. Queue wait: {self.summary()}"
+        )
+
+    def percentile(self, percent):
+        """Return the given percentile of the recent queue wait times (nearest rank)"""
+        with self.condition:
+            samples = sorted(self.wait_samples)
+        if not samples:
+            return 0.0
+        rank = max(1, math.ceil(percent / 100 * len(samples)))
+        return samples[rank - 1]
+
+    def summary(self):
+        """Return the queue statistics, wait times in milliseconds"""
+        return {
+            "queued": len(self.queue),
+            "matched": self.nb_matched,
+            "rooms_created": self.nb_rooms_created,
+            "p50_wait_ms": round(self.percentile(50) * 1000, 2),
+            "p99_wait_ms": round(self.percentile(99) * 1000, 2),
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
@@ -0,0 +1,31 @@
+"""
+Rate limiter for the server of the game "I Like Trains"
+Keeps a client flooding the server with inputs from slowing down every room
+"""
+
+
+class TokenBucket:
+    """
+    Holds up to burst tokens, refilled at rate tokens per second. Each input
+    of the client takes a token, and the inputs arriving while the bucket is
+    empty are dropped. Only used by the receive thread, so not thread-safe.
+    """
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = now
+        self.nb_dropped = 0
+
+    def consume(self, now):
+        """Take a token, return False if there was none left"""
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+        if self.tokens < 1:
+            self.nb_dropped += 1
+            return False
+        self.tokens -= 1
+        return True
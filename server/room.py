@@ -1,5 +1,8 @@
 from common.server_config import ServerConfig
+from common.state_delta import merge_state_delta
+from server.ai_client import AIClient
 from server.game import Game
+import collections
 import threading
 import time
 import json
@@ -9,6 +12,16 @@ import random
 # Configure logger
 logger = logging.getLogger("server.room")
 
+# Minimum time between two keyframes sent to a client on its request
+KEYFRAME_REQUEST_INTERVAL_SECONDS = 0.5
+
+# Time given to the clients to receive the game over message before the room closes
+ROOM_CLOSE_DELAY_SECONDS = 2.0
+
+# Number of recent state deltas kept to send clients the changes since the
+# last state they acknowledged. Clients further behind are sent a keyframe.
+STATE_HISTORY_SIZE = 128
+
 # List of names for AI-controlled clients
 AI_NAMES = [
     "Bot Adrian",
@@ -44,59 +57,105 @@ class Room:
         running,
         server_socket,
         send_cooldown_notification,
+        agent_registry,
+        high_score,
+        addr_to_sciper,
+        client_rtts,
+        client_acks,
+        scheduler,
+        remove_room,
     ):
         self.config = config
-        self.id = room_id
         self.nb_players_max = nb_players_max
         self.server_socket = server_socket
-        send_cooldown_notification
+        self.agent_registry = agent_registry
+        self.high_score = high_score
+        self.addr_to_sciper = addr_to_sciper  # Shared with the server
+        # {addr: round-trip time}, shared with the server
+        self.client_rtts = client_rtts
+        # {addr: last state seq received}, shared with the server
+        self.client_acks = client_acks
+        # Runs the end of the game and the closing of the room
+        self.scheduler = scheduler
+        self.remove_room = remove_room  # Called with the room id to close the room
 
         self.game = Game(config, send_cooldown_notification, self.nb_players_max)
         # TODO(alok): why not put room_id and server in Game's __init__ method?
         self.running = running
 
-        self.game.room_id = room_id  # Store the room ID in the Game object
+        self.states_lock = threading.RLock()
+        self.state_thread = None
+        self.game_thread = None
+        self.bots_thread = None
+        self.ai_clients = {}
+        self.AI_NAMES = AI_NAMES  # Store the AI names as an instance attribute
+
+        self.id = room_id
+        self.reset()
+        self.open(room_id)
+
+    def reset(self):
+        """
+        Forget the previous game, so that the room can be reused. The threads
+        of the game must have stopped (see is_stopped).
+        """
+        self.scheduler.cancel(("waiting_room", self.id))
+        self.scheduler.cancel(("end_game", self.id))
+        self.scheduler.cancel(("close_room", self.id))
+        self.game.reset(self.nb_players_max)
 
         self.clients = {}  # {addr: nickname}
         self.client_game_modes = {}  # {addr: game_mode}
         self.game_thread = None
+        self.state_thread = None
+        self.bots_thread = None  # Adds the bots and starts the game
+
+        # Sequence number of the last state delta, acknowledged by the clients
+        self.state_seq = 0
+        # [(seq, delta)]
+        self.state_history = collections.deque(maxlen=STATE_HISTORY_SIZE)
+        self.sent_seqs = {}  # {addr: seq of the last state sent}
+        # With adaptive broadcast rates, when each client is due for a state
+        self.next_state_send_times = {}  # {addr: time}
+        # Keyframes sent to each client, the base of its deltas until it acks
+        # a later state. Their time is used to rate-limit the client's requests.
+        self.keyframe_seqs = {}  # {addr: seq}
+        self.keyframe_send_times = {}  # {addr: time}
 
-        self.waiting_room_thread = None
         self.game_over = False  # Track if the game is over
-        self.room_creation_time = time.time()  # Track when the room was created
         self.first_client_join_time = None  # Track when the first client joins
-        self.stop_waiting_room = False  # Flag to stop the waiting room thread - Initialized BEFORE thread start
-
-        # Start waiting room broadcast thread
-        self.waiting_room_thread = threading.Thread(target=self.broadcast_waiting_room)
-        self.waiting_room_thread.daemon = True
-        self.waiting_room_thread.start()
-
         self.game_start_time = None  # Track when the game starts
-
         self.has_clients = False  # Track if the room has at least one human player
 
         self.used_ai_names = set()  # Track AI names that are already in use
         self.ai_clients = {}  # Maps train names to AI clients
-        self.AI_NAMES = AI_NAMES  # Store the AI names as an instance attribute
 
-        logger.info(f"Room {room_id} created with number of clients {nb_players_max}")
+    def open(self, room_id):
+        """Open the room to players, under a new id when it is reused"""
+        self.id = room_id
+        self.game.room_id = room_id  # Store the room ID in the Game object
+        self.running = True
+        self.room_creation_time = time.time()  # Track when the room was created
+
+        logger.info(
+            f"Room {room_id} created with number of clients {self.nb_players_max}"
+        )
+
+    def is_stopped(self):
+        """Return True once every thread of the room has stopped"""
+        threads = [self.state_thread, self.game_thread, self.bots_thread]
+        threads += [ai_client.thread for ai_client in self.ai_clients.values()]
+        return not any(thread and thread.is_alive() for thread in threads)
 
     def start_game(self):
         logger.debug("Starting game...")
-        # Start the state thread
-        self.state_thread = threading.Thread(target=self.broadcast_game_state)
-        self.state_thread.daemon = True
-        self.state_thread.start()
-
-        # Start the game timer thread
-        self.game_timer_thread = threading.Thread(target=self.game_timer)
-        self.game_timer_thread.daemon = True
-        self.game_timer_thread.start()
+        # End the game after game_duration_seconds
+        self.scheduler.schedule(
+            ("end_game", self.id), self.config.game_duration_seconds, self.end_game
+        )
 
-        # Stop the waiting room thread by setting the flag
-        self.stop_waiting_room = True
-        # self.waiting_room_thread.join() # Cannot join from the same thread
+        # The waiting room is over
+        self.scheduler.cancel(("waiting_room", self.id))
 
         if not self.game_thread:
             # Initialize game size based on connected players
@@ -131,6 +190,15 @@ class Room:
                 f"Game started in room {self.id} with {len(self.clients)} clients"
             )
 
+            # Let the clients still displaying the waiting room know
+            self.publish_waiting_room()
+
+        # Start the state thread once the game is initialized, its first
+        # message is a keyframe of the whole world
+        self.state_thread = threading.Thread(target=self.broadcast_game_state)
+        self.state_thread.daemon = True
+        self.state_thread.start()
+
     def get_available_ai_name(self):
         """Get an available AI name that is not already in use"""
         for name in self.AI_NAMES:
@@ -151,43 +219,67 @@ class Room:
             ai_nickname = self.get_available_ai_name()
 
         if ai_agent_file_name is None:
-            logger.debug(f"Using default agent file: {self.config.agent_file_name}")
-            ai_agent_file_name = self.config.agent_file_name
+            logger.debug(f"Using default agent file: {self.config.ai_agent_file_name}")
+            ai_agent_file_name = self.config.ai_agent_file_name
 
         # Choose an AI name that's not already in use
         if train_nickname_to_replace is None:
             # Creating a new AI train (not replacing an existing one)
             logger.info(f"Creating new AI train with name {ai_nickname}")
 
-            # Add the train to the game
-            if self.game.add_train(ai_nickname):
-                # Add the AI client to the room
-                self.clients[("AI", ai_nickname)] = ai_nickname
-
-                # Import the AI agent from the config path
-                logger.info(
-                    f"Creating AI client {ai_nickname} using agent from {ai_agent_file_name}"
-                )
-                from server.ai_client import AIClient
-
-                self.ai_clients[ai_nickname] = AIClient(
-                    self, ai_nickname, ai_agent_file_name
-                )
-
-                # Add the ai_client to the game
-                self.game.ai_clients[ai_nickname] = self.ai_clients[ai_nickname]
-
-                logger.info(f"Added new AI train {ai_nickname} to room {self.id}")
-                return ai_nickname
-            else:
-                logger.error(f"Failed to add new AI train {ai_nickname} to game")
-                return None
+            # The agent is created here, its constructor must not stall the game thread
+            if not self.load_ai_client(ai_nickname, ai_agent_file_name):
+                return
+            # Add the AI client to the room, it counts as a player right away
+            self.clients[("AI", ai_nickname)] = ai_nickname
+            # The game thread adds the train, the AI client waits for it
+            self.game.submit(lambda: self.add_ai_train(ai_nickname))
+            return ai_nickname
 
         # Check if there's already an AI controlling this train
         if train_nickname_to_replace in self.ai_clients:
             logger.warning(f"AI already exists for train {train_nickname_to_replace}")
             return
 
+        # Create the AI client with the new name, it waits for the train
+        if not self.load_ai_client(ai_nickname, ai_agent_file_name):
+            return
+        # The game thread renames the train, between two ticks
+        self.game.submit(
+            lambda: self.replace_train_with_ai(train_nickname_to_replace, ai_nickname)
+        )
+
+    def load_ai_client(self, ai_nickname, ai_agent_file_name):
+        """Create the AI client, return False if its agent couldn't be loaded"""
+        try:
+            self.ai_clients[ai_nickname] = AIClient(
+                self, ai_nickname, ai_agent_file_name
+            )
+        except Exception as e:
+            logger.error(f"Error creating AI client {ai_nickname}: {e}")
+            self.remove_ai_client(ai_nickname)
+            return False
+        return True
+
+    def remove_ai_client(self, ai_nickname):
+        """Stop and forget an AI client whose train couldn't be added"""
+        ai_client = self.ai_clients.pop(ai_nickname, None)
+        if ai_client:
+            ai_client.stop()
+        self.clients.pop(("AI", ai_nickname), None)
+
+    def add_ai_train(self, ai_nickname):
+        """Add the train of a new AI client to the game, run by the game thread"""
+        if self.game.add_train(ai_nickname):
+            # Add the ai_client to the game
+            self.game.ai_clients[ai_nickname] = self.ai_clients[ai_nickname]
+            logger.info(f"Added new AI train {ai_nickname} to room {self.id}")
+        else:
+            logger.error(f"Failed to add new AI train {ai_nickname} to game")
+            self.remove_ai_client(ai_nickname)
+
+    def replace_train_with_ai(self, train_nickname_to_replace, ai_nickname):
+        """Hand the train of a client which left to an AI client, run by the game thread"""
         # Change the train's name in the game
         if train_nickname_to_replace in self.game.trains:
             # Save the train's color
@@ -208,6 +300,8 @@ class Room:
             logger.debug(
                 f"Moved train {train_nickname_to_replace} to {ai_nickname} in game"
             )
+            # The AI client is told when the train dies
+            self.game.ai_clients[ai_nickname] = self.ai_clients[ai_nickname]
 
             # # Mark trains as dirty to update clients
             # room.game._dirty["trains"] = True
@@ -219,6 +313,8 @@ class Room:
             }
 
             state_json = json.dumps(state_data) + "\n"
+            # Changes of the train not acknowledged yet must follow it to its new name
+            self.rename_history_train(train_nickname_to_replace, ai_nickname)
             # Iterate over a copy of the client addresses to avoid issues if the list changes
             # Only send to non-AI clients
             for client_addr in list(self.clients.keys()):
@@ -238,29 +334,11 @@ class Room:
                 # else: # Optional: Log skipped AI clients if needed for debugging
                 #    logger.debug(f"Skipping rename notification for AI client: {client_addr}")
 
-            # Create the AI client with the new name
-            self.ai_clients[ai_nickname] = AIClient(
-                self, ai_nickname, ai_agent_file_name
-            )
-
         else:
             logger.warning(
                 f"Train {train_nickname_to_replace} not found in game, cannot create AI client"
             )
-
-    def game_timer(self):
-        """
-        Thread that monitors game time and ends the game after game_duration_seconds.
-        """
-        while self.running and not self.game_over:
-            if self.game_start_time is not None:
-                elapsed_time = time.time() - self.game_start_time
-
-                if elapsed_time >= self.config.game_duration_seconds:
-                    self.end_game()
-                    break
-
-            time.sleep(1)  # Check every second
+            self.remove_ai_client(ai_nickname)
 
     def end_game(self):
         """End the game and send final scores to all clients"""
@@ -295,7 +373,7 @@ class Room:
 
             # Update best score in the scores file if we have a valid sciper
             if player_sciper:
-                if self.game.server.high_score.update(player_sciper, best_score):
+                if self.high_score.update(player_sciper, best_score):
                     scores_updated = True
                     logger.info(
                         f"Updated best score for {nickname} (sciper: {player_sciper}): {best_score}"
@@ -303,11 +381,27 @@ class Room:
 
         # Save scores if any were updated
         if scores_updated:
-            self.game.server.high_score.save()
+            self.high_score.save()
 
         # Sort scores in descending order
         final_scores.sort(key=lambda x: x["best_score"], reverse=True)
 
+        # Report how long each bot took to decide on its moves
+        agent_latency = {}
+        for nickname, ai_client in self.ai_clients.items():
+            agent_latency[nickname] = ai_client.agent.latency.summary()
+            if agent_latency[nickname]["missed_deadlines"] > 0:
+                logger.warning(
+                    f"Slow agent {nickname}: {agent_latency[nickname]['missed_deadlines']} decisions missed their move deadline {agent_latency[nickname]}"
+                )
+            else:
+                logger.info(f"Agent {nickname} latency: {agent_latency[nickname]}")
+
+        # Direction changes replaced by a later one before the tick applied them
+        logger.info(
+            f"Direction changes coalesced in room {self.id}: {self.game.nb_directions_coalesced}"
+        )
+
         # Create game over message
         game_over_data = {
             "type": "game_over",
@@ -315,7 +409,8 @@ class Room:
                 "message": "Game is over. Time limit reached.",
                 "final_scores": final_scores,
                 "duration": self.config.game_duration_seconds,
-                "best_scores": self.game.server.high_score.get(),
+                "best_scores": self.high_score.get(),
+                "agent_latency": agent_latency,
             },
         }
 
@@ -338,19 +433,15 @@ class Room:
         self.game.running = False
 
         # Close the room after a short delay to ensure all clients receive the game over message
-        def close_room_after_delay():
-            time.sleep(
-                2
-            )  # Wait 2 seconds to ensure clients receive the game over message
-            logger.info(f"Closing room {self.id} after game over")
-            self.running = False
-            # Remove the room from the server
-            self.remove_room(self.id)
-
-        # Start a thread to close the room after a delay
-        close_thread = threading.Thread(target=close_room_after_delay)
-        close_thread.daemon = True
-        close_thread.start()
+        self.scheduler.schedule(
+            ("close_room", self.id), ROOM_CLOSE_DELAY_SECONDS, self.close_after_game
+        )
+
+    def close_after_game(self):
+        logger.info(f"Closing room {self.id} after game over")
+        self.running = False
+        # Remove the room from the server
+        self.remove_room(self.id)
 
     def is_full(self):
         nb_players = self.get_player_count()
@@ -374,76 +465,88 @@ class Room:
             [mode for mode in self.client_game_modes.values() if mode == "observer"]
         )
 
-    def broadcast_waiting_room(self):
-        """Broadcast waiting room data to all clients"""
-        last_update = time.time()
-        while self.running and not self.stop_waiting_room:
-            # try:
-            if self.clients and not self.game_thread:
-                current_time = time.time()
-                if (
-                    current_time - last_update >= 1.0 / self.config.tick_rate
-                ):  # Limit to TICK_RATE Hz
-                    if self.clients:
-                        # Calculate remaining time before adding bots
-                        remaining_time = 0
-                        if self.has_clients:
-                            # Use the time the first client joined if available, otherwise creation time
-                            start_time = (
-                                self.first_client_join_time
-                                if self.first_client_join_time is not None
-                                else self.room_creation_time
-                            )
-                            elapsed_time = current_time - start_time
-                            remaining_time = max(
-                                0,
-                                self.config.waiting_time_before_bots_seconds
-                                - elapsed_time,
-                            )
-
-                        # If time is up and room is not full, add bots and start the game
-                        if (remaining_time == 0) and not self.game_thread:
-                            logger.info(
-                                f"Waiting time expired for room {self.id}, adding bots and starting game"
-                            )
-                            self.fill_with_bots()
-                            self.start_game()
-
-                    waiting_room_data = {
-                        "type": "waiting_room",
-                        "data": {
-                            "room_id": self.id,
-                            "players": list(self.get_players()),
-                            "nb_players": self.nb_players_max,
-                            "game_started": self.game_thread is not None,
-                            "waiting_time": int(remaining_time),
-                        },
-                    }
-
-                    state_json = json.dumps(waiting_room_data) + "\n"
-                    for client_addr in list(self.clients.keys()):
-                        try:
-                            # Skip AI clients - they don't need network messages
-                            if (
-                                isinstance(client_addr, tuple)
-                                and len(client_addr) == 2
-                                and client_addr[0] == "AI"
-                            ):
-                                continue
-
-                            self.server_socket.sendto(state_json.encode(), client_addr)
-                        except Exception as e:
-                            logger.error(
-                                f"Error sending waiting room data to client: {e}"
-                            )
+    def get_remaining_waiting_time(self):
+        """Return the seconds left before the game starts with bots"""
+        if not self.has_clients:
+            return 0
+        # Use the time the first client joined if available, otherwise creation time
+        start_time = (
+            self.first_client_join_time
+            if self.first_client_join_time is not None
+            else self.room_creation_time
+        )
+        return max(
+            0,
+            self.config.waiting_time_before_bots_seconds - (time.time() - start_time),
+        )
 
-                    last_update = current_time
+    def waiting_room_changed(self):
+        """Publish the waiting room right away, after a player joined or left"""
+        if not self.game_thread:
+            self.scheduler.schedule(
+                ("waiting_room", self.id), 0, self.update_waiting_room
+            )
+
+    def update_waiting_room(self):
+        """
+        Scheduled once per second while players wait: publishes the countdown,
+        and starts the game with bots once the waiting time is over
+        """
+        if not self.running or self.game_thread or self.bots_thread or not self.clients:
+            return
+
+        remaining_time = self.get_remaining_waiting_time()
+        if remaining_time == 0:
+            logger.info(
+                f"Waiting time expired for room {self.id}, adding bots and starting game"
+            )
+            # Loading the agents can be slow, it mustn't hold up the other rooms
+            self.bots_thread = threading.Thread(target=self.start_game_with_bots)
+            self.bots_thread.daemon = True
+            self.bots_thread.start()
+            return
 
-            # Sleep for half the period
-            time.sleep(1.0 / (self.config.tick_rate * 2))
-            # except Exception as e:
-            #     logger.error(f"Error in broadcast_waiting_room: {e}")
-            #     time.sleep(1.0 / self.config.tick_rate)
+        self.publish_waiting_room()
+        # Wake up on time to start the game
+        self.scheduler.schedule(
+            ("waiting_room", self.id),
+            min(1.0, remaining_time),
+            self.update_waiting_room,
+        )
+
+    def start_game_with_bots(self):
+        """Fill the room with bots and start the game, run by the bots thread"""
+        try:
+            self.fill_with_bots()
+        except Exception as e:
+            logger.error(f"Error adding bots to room {self.id}: {e}")
+        # Start the game anyway, so that the players don't wait forever
+        if self.running:
+            self.start_game()
+
+    def publish_waiting_room(self):
+        """Send the waiting room to its clients, encoded once for all of them"""
+        waiting_room_data = {
+            "type": "waiting_room",
+            "data": {
+                "room_id": self.id,
+                "players": list(self.get_players()),
+                "nb_players": self.nb_players_max,
+                "game_started": self.game_thread is not None,
+                "waiting_time": int(self.get_remaining_waiting_time()),
+            },
+        }
+
+        state_json = (json.dumps(waiting_room_data) + "\n").encode()
+        for client_addr in list(self.clients.keys()):
+            try:
+                # Skip AI clients - they don't need network messages
+                if self.is_ai_client(client_addr):
+                    continue
+
+                self.server_socket.sendto(state_json, client_addr)
+            except Exception as e:
+                logger.error(f"Error sending waiting room data to client: {e}")
 
     def broadcast_game_state(self):
         """Thread that periodically sends the game state to clients"""
@@ -454,6 +557,7 @@ class Room:
             "type": "initial_state",
             "data": {
                 "game_life_time": self.config.game_duration_seconds,
+                "tick_rate": self.config.tick_rate,
                 "start_time": time.time(),  # Send server start time for synchronization
             },
         }
@@ -473,6 +577,14 @@ class Room:
             except Exception as e:
                 logger.error(f"Error sending initial state to client: {e}")
 
+        # The first delta holds the whole world too, but a client missing it
+        # would never get the fields which don't change
+        for client_addr in list(self.clients.keys()):
+            if not self.is_ai_client(client_addr):
+                self.send_keyframe(client_addr)
+
+        # The game runs at tick_rate, its state is sent at broadcast_rate. The
+        # dirty flags of the game accumulate the changes of the ticks in between.
         last_update = time.time()
         while self.running:
             try:
@@ -481,38 +593,182 @@ class Room:
                 elapsed = current_time - last_update
 
                 # If enough time has passed
-                if elapsed >= 1.0 / self.config.tick_rate:
+                if elapsed >= 1.0 / self.config.broadcast_rate:
                     # Get the game state with only the modified data
                     state = self.game.get_state()
-                    if state:  # If data has been modified
-                        # Create the data packet
-                        state_data = {"type": "state", "data": state}
-
-                        # Send the state to all clients
-                        state_json = json.dumps(state_data) + "\n"
-                        for client_addr in list(self.clients.keys()):
-                            try:
-                                # Skip AI clients - they don't need network messages
-                                if (
-                                    isinstance(client_addr, tuple)
-                                    and len(client_addr) == 2
-                                    and client_addr[0] == "AI"
-                                ):
-                                    continue
-
-                                self.server_socket.sendto(
-                                    state_json.encode(), client_addr
-                                )
-                            except Exception as e:
-                                logger.error(f"Error sending state to client: {e}")
+                    self.send_states(state, current_time)
 
                     last_update = current_time
 
                 # Wait a bit to avoid overloading the CPU
-                time.sleep(1.0 / (self.config.tick_rate * 2))
+                time.sleep(1.0 / (self.config.broadcast_rate * 2))
             except Exception as e:
                 logger.error(f"Error in broadcast_game_state: {e}")
-                time.sleep(1.0 / self.config.tick_rate)
+                time.sleep(1.0 / self.config.broadcast_rate)
+
+    def is_ai_client(self, client_addr):
+        return (
+            isinstance(client_addr, tuple)
+            and len(client_addr) == 2
+            and client_addr[0] == "AI"
+        )
+
+    def send_states(self, state, current_time):
+        """
+        Record the new state delta, if any, and send each client the changes
+        since the last state it acknowledged, merged from the recent deltas.
+        A lost delta is thus sent again until the client acknowledges a later
+        state, instead of being missed until its fields change again. Clients
+        behind the history are sent a keyframe. With adaptive broadcast rates,
+        each client is sent a state at most once per round-trip time (see
+        get_state_interval).
+        """
+        with self.states_lock:
+            if state:
+                self.state_seq += 1
+                self.state_history.append((self.state_seq, state))
+
+            messages = {}  # {base seq: encoded message}, shared by the clients
+            for client_addr in list(self.clients.keys()):
+                # Skip AI clients - they don't need network messages
+                if self.is_ai_client(client_addr):
+                    continue
+                # Nothing new since the last state sent to the client
+                if self.sent_seqs.get(client_addr, 0) >= self.state_seq:
+                    continue
+                if (
+                    self.config.adaptive_broadcast_rate
+                    and current_time < self.next_state_send_times.get(client_addr, 0)
+                ):
+                    continue
+
+                base_seq = self.get_base_seq(client_addr)
+                if base_seq is None:
+                    self.send_keyframe(client_addr)
+                    continue
+                message = messages.get(base_seq)
+                if message is None:
+                    message = messages[base_seq] = self.encode_delta(base_seq)
+
+                try:
+                    self.server_socket.sendto(message, client_addr)
+                except Exception as e:
+                    logger.error(f"Error sending state to client: {e}")
+                self.sent_seqs[client_addr] = self.state_seq
+                if self.config.adaptive_broadcast_rate:
+                    self.next_state_send_times[client_addr] = (
+                        current_time + self.get_state_interval(client_addr)
+                    )
+
+            # Forget the clients which left the room
+            for client_addr in list(self.sent_seqs):
+                if client_addr not in self.clients:
+                    for mapping in (
+                        self.sent_seqs,
+                        self.next_state_send_times,
+                        self.keyframe_seqs,
+                        self.keyframe_send_times,
+                    ):
+                        mapping.pop(client_addr, None)
+
+    def get_base_seq(self, client_addr):
+        """
+        Return the seq of the state the deltas sent to a client are based on,
+        or None if the deltas since then are no longer in the history
+        """
+        base_seq = max(
+            self.client_acks.get(client_addr, -1),
+            self.keyframe_seqs.get(client_addr, -1),
+        )
+        if base_seq < 0:
+            return None
+        # The deltas since base_seq start with the one right after it
+        if self.state_history and self.state_history[0][0] > base_seq + 1:
+            return None
+        return base_seq
+
+    def encode_delta(self, base_seq):
+        """Return the message holding the changes since the state base_seq"""
+        delta = {}
+        for seq, state in self.state_history:
+            if seq > base_seq:
+                merge_state_delta(delta, state)
+        # The client checks it has every state up to first_seq - 1
+        return (
+            json.dumps(
+                {
+                    "type": "state",
+                    "seq": self.state_seq,
+                    "first_seq": base_seq + 1,
+                    "data": delta,
+                }
+            )
+            + "\n"
+        ).encode()
+
+    def get_state_interval(self, client_addr):
+        """Return the time between two states sent to a client, based on its round-trip time"""
+        interval = 1.0 / self.config.broadcast_rate
+        rtt = self.client_rtts.get(client_addr)
+        if rtt is None:
+            return interval
+        return min(max(interval, rtt), 1.0 / self.config.min_broadcast_rate)
+
+    def rebind_client(self, old_addr, new_addr):
+        """Move a client which resumed its session to its new address"""
+        with self.states_lock:
+            for mapping in (
+                self.clients,
+                self.client_game_modes,
+                self.sent_seqs,
+                self.next_state_send_times,
+                self.keyframe_seqs,
+                self.keyframe_send_times,
+            ):
+                if old_addr in mapping:
+                    mapping[new_addr] = mapping.pop(old_addr)
+
+    def send_keyframe(self, client_addr, requested=False):
+        """
+        Send the complete game state to a client, if the game started. The
+        client replaces its world with it. Requests from the client (after it
+        detected lost deltas) are rate-limited.
+        """
+        if self.game_thread is None:
+            return
+        current_time = time.time()
+        with self.states_lock:
+            if (
+                requested
+                and current_time - self.keyframe_send_times.get(client_addr, 0)
+                < KEYFRAME_REQUEST_INTERVAL_SECONDS
+            ):
+                return
+            self.keyframe_send_times[client_addr] = current_time
+
+            state_data = {
+                "type": "state",
+                "seq": self.state_seq,
+                "keyframe": True,
+                "data": self.game.get_full_state(),
+            }
+            # The keyframe contains every change up to now
+            self.keyframe_seqs[client_addr] = self.state_seq
+            self.sent_seqs[client_addr] = self.state_seq
+            try:
+                self.server_socket.sendto(
+                    (json.dumps(state_data) + "\n").encode(), client_addr
+                )
+            except Exception as e:
+                logger.error(f"Error sending keyframe to client {client_addr}: {e}")
+
+    def rename_history_train(self, old_name, new_name):
+        """Move the recent changes of a renamed train to its new name"""
+        with self.states_lock:
+            for _, state in self.state_history:
+                trains = state.get("trains", {})
+                if old_name in trains:
+                    trains[new_name] = trains.pop(old_name)
 
     def fill_with_bots(self):
         """Fill the room with bots and start the game"""
@@ -0,0 +1,64 @@
+"""
+Scheduler for the server of the game "I Like Trains"
+Runs delayed tasks, like ending games and closing rooms, on a single thread
+"""
+
+import logging
+import threading
+import time
+
+from server.timer_wheel import TimerWheel
+
+
+logger = logging.getLogger("server.scheduler")
+
+
+class Scheduler:
+    """
+    Tasks are callbacks identified by a key, run once their delay elapsed.
+    Their deadlines are kept in a TimerWheel checked every resolution seconds
+    by the scheduler thread, instead of each task sleeping in a thread of its
+    own. Scheduling a key again replaces its task. Tasks run one after the
+    other, so they must be short. Methods are thread-safe.
+    """
+
+    def __init__(self, resolution, nb_slots):
+        self.resolution = resolution
+        self.timers = TimerWheel(resolution, nb_slots, time.time())
+        self.tasks = {}  # {key: callback}
+        self.lock = threading.Lock()
+
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def schedule(self, key, delay, callback):
+        """Run the callback in delay seconds, replacing the task of the key"""
+        with self.lock:
+            self.tasks[key] = callback
+            self.timers.schedule(key, time.time() + delay)
+
+    def cancel(self, key):
+        """Drop the task of the key, if it didn't run yet"""
+        with self.lock:
+            self.tasks.pop(key, None)
+            self.timers.cancel(key)
+
+    def run(self):
+        """Thread that runs the tasks which are due"""
+        while self.running:
+            time.sleep(self.resolution)
+            with self.lock:
+                due = [
+                    (key, self.tasks.pop(key))
+                    for key in self.timers.pop_expired(time.time())
+                    if key in self.tasks
+                ]
+            for key, callback in due:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Error in scheduled task {key}: {e}")
+
+    def stop(self):
+        self.running = False
@@ -7,10 +7,43 @@ import uuid
 import signal
 import random
 
+from common.agent_registry import AgentRegistry
 from common.config import Config
 from server.high_score import HighScore
-from server.passenger import Passenger
+from server.matchmaking import Matchmaker
+from server.rate_limiter import TokenBucket
 from server.room import Room
+from server.scheduler import Scheduler
+from server.timer_wheel import TimerWheel
+
+
+# Weight of the latest ping in the smoothed round-trip time of a client
+RTT_SMOOTHING = 0.25
+
+# Precision of the client timeouts and of the ping schedule
+LIVENESS_RESOLUTION_SECONDS = 0.05
+LIVENESS_NB_SLOTS = 256
+
+# Active clients are never idle long enough to be pinged, they are sent a ping
+# this often to measure their round-trip time
+RTT_PROBE_INTERVAL_SECONDS = 2.0
+
+# Precision of the delayed tasks (end of the games, closing of the rooms)
+SCHEDULER_RESOLUTION_SECONDS = 0.1
+SCHEDULER_NB_SLOTS = 1024
+
+# Time given to the threads of a removed room to stop before it is reused
+ROOM_RECYCLE_DELAY_SECONDS = 1.0
+
+# Raw forms of the actions limited by the rate limiter, encoded by json.dumps
+# with its default or compact separators, so that other messages merely
+# holding these words (e.g. a nickname) are not limited
+RATE_LIMITED_ACTIONS = (
+    '"action": "direction"',
+    '"action":"direction"',
+    '"action": "drop_wagon"',
+    '"action":"drop_wagon"',
+)
 
 
 def setup_server_logger():
@@ -56,12 +89,24 @@ class Server:
     def __init__(self, config: Config):
         self.config = config.server
         self.rooms = {}  # {room_id: Room}
+        self.room_pool = []  # Rooms of finished games, reset and ready for reuse
         self.lock = threading.Lock()
 
         self.high_score = HighScore()
         self.high_score.load()
         self.high_score.dump()
 
+        # Import every agent once, so that bots are created from cached classes
+        self.agent_registry = AgentRegistry()
+        agent_errors = self.agent_registry.preload(
+            [agent.agent_file_name for agent in self.config.agents]
+            + [self.config.ai_agent_file_name]
+        )
+        for module_name, error in agent_errors.items():
+            logger.warning(f"Agent {module_name} is unavailable: {error}")
+        if self.config.hot_reload_agents:
+            self.agent_registry.start_watcher()
+
         host = self.config.host
 
         # Create UDP socket with proper error handling
@@ -89,14 +134,39 @@ class Server:
         # Ping tracking for active connection checking
         self.ping_interval = self.config.client_timeout_seconds / 2
         self.ping_responses = {}  # Track which clients have responded to pings
+        self.client_rtts = {}  # Maps client addresses to their smoothed ping round-trip time
+        self.client_acks = {}  # Maps client addresses to the last state sequence number they received
+        self.session_addrs = {}  # Maps session tokens to the current address of their client
+        self.addr_to_session = {}  # Maps client addresses to their session token
+        self.input_buckets = {}  # Maps client addresses to the TokenBucket limiting their inputs
+        self.nb_inputs_dropped = 0
+
+        # Deadline of each client, ping_interval after its last message. An idle
+        # client is then pinged, and disconnected once it was idle for
+        # client_timeout_seconds (see check_idle_client)
+        self.liveness = TimerWheel(
+            LIVENESS_RESOLUTION_SECONDS, LIVENESS_NB_SLOTS, time.time()
+        )
 
         # Start the ping thread (handles all client timeouts)
         self.ping_thread = threading.Thread(target=self.ping_clients)
         self.ping_thread.daemon = True
         self.ping_thread.start()
 
-        # Create the first room
-        self.create_room(True)
+        # Runs the delayed tasks of the rooms
+        self.scheduler = Scheduler(SCHEDULER_RESOLUTION_SECONDS, SCHEDULER_NB_SLOTS)
+
+        # Clients joining are queued and assigned rooms by the matchmaker
+        self.matchmaker = Matchmaker(
+            self.high_score,
+            self.config.rating_band_size,
+            self.config.matchmaking_batch_seconds,
+            lambda: self.create_room(True),
+            self.join_room,
+        )
+
+        # Create the first room, for new players
+        self.matchmaker.add_open_room(self.create_room(True), 0)
 
         # Start accepting clients
         accept_thread = threading.Thread(target=self.accept_clients, daemon=True)
@@ -112,35 +182,33 @@ class Server:
         nb_players_per_room = self.config.nb_clients_per_room
         logger.info(f"Creating room {room_id} with size {nb_players_per_room}.")
 
-        new_room = Room(
-            self.config,
-            room_id,
-            nb_players_per_room,
-            running,
-            self.server_socket,
-            self.send_cooldown_notification,
-        )
+        # Reuse a room of a previous game when there is one
+        with self.lock:
+            new_room = self.room_pool.pop() if self.room_pool else None
+        if new_room is not None:
+            logger.debug(f"Reusing room {new_room.id} of a previous game")
+            new_room.open(room_id)
+        else:
+            new_room = Room(
+                self.config,
+                room_id,
+                nb_players_per_room,
+                running,
+                self.server_socket,
+                self.send_cooldown_notification,
+                self.agent_registry,
+                self.high_score,
+                self.addr_to_sciper,
+                self.client_rtts,
+                self.client_acks,
+                self.scheduler,
+                self.remove_room,
+            )
 
         logger.info(f"Created new room {room_id} with {nb_players_per_room} clients")
         self.rooms[room_id] = new_room
         return new_room
 
-    def get_available_room(self):
-        """Get an available room or create a new one if needed"""
-        # First try to find a non-full room
-        for room in self.rooms.values():
-            if (
-                room.nb_players_max == self.config.nb_clients_per_room
-                and not room.is_full()
-                and not room.game_thread
-            ):
-                return room
-        logger.debug(
-            f"No suitable room found for {self.config.nb_clients_per_room} clients"
-        )
-        # If no suitable room found, create a new one
-        return self.create_room(True)
-
     def accept_clients(self):
         """Thread that waits for new connections"""
         logger.info("Server is listening for UDP packets")
@@ -168,6 +236,8 @@ class Server:
                     for message_str in messages:
                         if not message_str:
                             continue
+                        if not self.accept_input(message_str, addr):
+                            continue
 
                         # try: // TODO RESTORE
                         message = json.loads(message_str)
@@ -195,6 +265,32 @@ class Server:
                 # Add a small delay to avoid high CPU usage on error
                 time.sleep(0.1)
 
+    def accept_input(self, message_str, addr):
+        """
+        Return False if the message is an input of a client over its rate
+        limit. Checked on the raw message, so the inputs dropped are not parsed.
+        """
+        if addr not in self.addr_to_sciper or not any(
+            action in message_str for action in RATE_LIMITED_ACTIONS
+        ):
+            return True
+
+        current_time = time.time()
+        bucket = self.input_buckets.get(addr)
+        if bucket is None:
+            bucket = self.input_buckets[addr] = TokenBucket(
+                self.config.input_rate_limit, self.config.input_burst, current_time
+            )
+        if bucket.consume(current_time):
+            return True
+
+        self.nb_inputs_dropped += 1
+        if bucket.nb_dropped == 1:
+            logger.warning(
+                f"Client {self.addr_to_name.get(addr)} exceeds {self.config.input_rate_limit} inputs per second, dropping its inputs over the limit"
+            )
+        return False
+
     def find_client_room(self, agent_sciper):
         for room in self.rooms.values():
             for addr in room.clients:
@@ -228,16 +324,58 @@ class Server:
                 if self.handle_name_check(message, None) and self.handle_sciper_check(message, None):
                     self.handle_new_client(message, addr)
 
-        self.client_last_activity[addr] = time.time()
-        if addr not in self.addr_to_sciper:  # Only handle if it's a new client address
+        # A client whose address changed (e.g. new NAT port) resumes its session
+        session_token = message.get("session_token")
+        if session_token and addr not in self.addr_to_sciper:
+            if not self.handle_resume(session_token, addr):
+                self.send_disconnect(addr, "Unknown session")
+                return
+
+        if addr in self.addr_to_sciper:
+            # Any message proves the client is alive
+            self.record_activity(addr)
+        else:
+            # Acks, inputs and ping answers of unknown addresses are dropped. A
+            # client whose address changed resumes its session with its
+            # keepalive ping, which holds its session token.
+            if "ack" in message or "action" in message or message.get("type") == "pong":
+                return
+            # Only handle if it's a new client address
             self.handle_new_client(message, addr)
+        if message.get("type") == "resume":
+            return
+
+        # Clients acknowledge the last state they received in their messages,
+        # acks reordered by the network must not move back
+        if "ack" in message:
+            ack = message["ack"]
+            room = self.find_client_room(self.addr_to_sciper[addr])
+            # Acks of states that weren't sent yet would make the room send
+            # deltas ending before they start
+            if (
+                isinstance(ack, int)
+                and not isinstance(ack, bool)
+                and room
+                and ack <= room.state_seq
+            ):
+                self.client_acks[addr] = max(ack, self.client_acks.get(addr, ack))
+            # Clients which have nothing else to send acknowledge periodically
+            if message.get("type") == "ack":
+                return
 
         # Handle ping responses for everyone
         if "type" in message and message["type"] == "pong":
-            self.client_last_activity[addr] = time.time()
             # Client has responded to a ping, update the ping responses dictionary
             if addr in self.ping_responses:
+                rtt = time.time() - self.ping_responses[addr]
                 del self.ping_responses[addr]  # Remove from pending responses
+                # Smooth the round-trip time, used to adapt the broadcast rate
+                if addr in self.client_rtts:
+                    rtt = (
+                        RTT_SMOOTHING * rtt
+                        + (1 - RTT_SMOOTHING) * self.client_rtts[addr]
+                    )
+                self.client_rtts[addr] = rtt
             return
 
         # Handle ping messages from unknown clients (for connection verification)
@@ -265,11 +403,67 @@ class Server:
             #         f"Received message from {addr} ({agent_sciper}) but client not in any room. Message: {message}"
             #     )
         else:
-            # This is an unknown client sending a message that's not a common type
+            # This is an unknown client sending a message that's not a common type.
+            # It may be a known client whose address changed, ask it to resume its
+            # session. Clients without a session disconnect.
             logger.debug(f"Received message from unknown client {addr}: {message}")
-            # Send a disconnect request to the client
-            self.send_disconnect(addr, "Unknown client")
-            logger.info(f"Sent disconnect request to unknown client {addr}")
+            try:
+                self.server_socket.sendto(
+                    (json.dumps({"type": "resume_required"}) + "\n").encode(), addr
+                )
+            except Exception as e:
+                logger.error(f"Error sending resume request to {addr}: {e}")
+
+    def handle_resume(self, session_token, addr):
+        """
+        Move the session of a client to its new address, without handing its
+        train to an AI. Returns False if the session is unknown or expired.
+        """
+        old_addr = self.session_addrs.get(session_token)
+        if old_addr is None or old_addr == addr:
+            return False
+
+        logger.info(
+            f"Client {self.addr_to_name.get(old_addr)} resumed its session from {addr} (was {old_addr})"
+        )
+
+        # The room is found from the old address, look it up before moving it
+        agent_sciper = self.addr_to_sciper.get(old_addr)
+        room = self.find_client_room(agent_sciper) if agent_sciper else None
+
+        # Move the client's information to its new address
+        for mapping in (
+            self.addr_to_name,
+            self.addr_to_sciper,
+            self.addr_to_game_mode,
+            self.addr_to_session,
+            self.client_rtts,
+            self.client_acks,
+            self.input_buckets,
+        ):
+            if old_addr in mapping:
+                mapping[addr] = mapping.pop(old_addr)
+        self.session_addrs[session_token] = addr
+        if agent_sciper:
+            self.sciper_to_addr[agent_sciper] = addr
+        if old_addr in self.client_last_activity:
+            del self.client_last_activity[old_addr]
+        if old_addr in self.ping_responses:
+            del self.ping_responses[old_addr]
+        self.forget_liveness(old_addr)
+
+        try:
+            self.server_socket.sendto(
+                (json.dumps({"type": "resume_success"}) + "\n").encode(), addr
+            )
+        except Exception as e:
+            logger.error(f"Error sending resume success to {addr}: {e}")
+
+        # The client may have missed deltas, send it the whole state right away
+        if room:
+            room.rebind_client(old_addr, addr)
+            room.send_keyframe(addr)
+        return True
 
     def send_disconnect(self, addr, message="Unknown client or invalid message format"):
         """Disconnect a client from the server"""
@@ -377,7 +571,7 @@ class Server:
     def handle_sciper_check(self, message, addr):
         """Handle sciper check requests"""
         # Update client activity timestamp
-        # self.client_last_activity[addr] = time.time()
+        # self.record_activity(addr)
         logger.debug(f"Checking sciper availability for {message['agent_sciper']}")
 
         sciper_to_check = message.get("agent_sciper", "")
@@ -444,7 +638,6 @@ class Server:
 
         if game_mode == "observer":
             logger.info(f"New client connected in OBSERVER mode: {addr}")
-            self.client_last_activity[addr] = time.time()
 
             # generate a random name and sciper
             nickname = f"Observer_{random.randint(1000, 9999)}"
@@ -463,9 +656,6 @@ class Server:
             f"\nNew client {nickname} (sciper: {agent_sciper}) connecting from {addr}"
         )
 
-        # Initialize client activity tracking
-        self.client_last_activity[addr] = time.time()
-
         # Log new client connection
         logger.info(
             f"New client {nickname} (sciper: {agent_sciper}) connecting from {addr}"
@@ -492,19 +682,44 @@ class Server:
                     del self.client_last_activity[old_addr]
                 if old_addr in self.ping_responses:
                     del self.ping_responses[old_addr]
+                self.forget_liveness(old_addr)
+                if old_addr in self.client_rtts:
+                    del self.client_rtts[old_addr]
+                if old_addr in self.client_acks:
+                    del self.client_acks[old_addr]
+                self.input_buckets.pop(old_addr, None)
+                if old_addr in self.addr_to_session:
+                    del self.session_addrs[self.addr_to_session.pop(old_addr)]
+                self.matchmaker.cancel(old_addr)
 
         # Associate address with name and sciper
         self.addr_to_name[addr] = nickname
+        # The session lets the client resume from another address
+        session_token = uuid.uuid4().hex
+        self.session_addrs[session_token] = addr
+        self.addr_to_session[addr] = session_token
         self.addr_to_sciper[addr] = agent_sciper
         self.addr_to_game_mode[addr] = game_mode
         self.sciper_to_addr[agent_sciper] = addr
+        self.record_activity(addr)
 
         # Remove from disconnected_clients if present (just in case)
         if addr in self.disconnected_clients:
             self.disconnected_clients.remove(addr)
 
-        # Assign to a room
-        selected_room = self.get_available_room()
+        # The matchmaker assigns the client a room, see join_room
+        self.matchmaker.enqueue(addr, agent_sciper)
+
+    def join_room(self, addr, selected_room):
+        """Add a client to the room the matchmaker assigned it"""
+        # The client may have left while it was queued
+        if addr not in self.addr_to_sciper:
+            return
+        nickname = self.addr_to_name[addr]
+        agent_sciper = self.addr_to_sciper[addr]
+        game_mode = self.addr_to_game_mode[addr]
+        session_token = self.addr_to_session[addr]
+
         selected_room.clients[addr] = nickname
         selected_room.client_game_modes[addr] = game_mode
 
@@ -526,37 +741,17 @@ class Server:
                 "room_id": selected_room.id,
                 "current_players": len(selected_room.clients),
                 "max_players": selected_room.nb_players_max,
+                "session_token": session_token,
             },
         }
         self.server_socket.sendto((json.dumps(response) + "\n").encode(), addr)
 
-        # if self.config.game_mode != GameMode.OBSERVER:
-        # Send initial game state immediately
-        game_status = {
-            "type": "waiting_room",
-            "data": {
-                "room_id": selected_room.id,
-                "players": list(selected_room.clients.values()),
-                "nb_players": selected_room.nb_players_max,
-                "game_started": selected_room.game_thread is not None,
-                "waiting_time": int(
-                    max(
-                        0,
-                        self.config.waiting_time_before_bots_seconds
-                        - (time.time() - selected_room.room_creation_time),
-                    )
-                )
-                if selected_room.has_clients
-                else 0,
-            },
-        }
-        self.server_socket.sendto((json.dumps(game_status) + "\n").encode(), addr)
+        # Show the new player to everyone in the waiting room
+        selected_room.waiting_room_changed()
 
     def handle_client_message(self, addr, message, room):
         """Handles messages received from the client"""
         try:
-            # Update client activity timestamp
-
             nickname = room.clients.get(addr)
             if message.get("action") == "check_name":
                 self.handle_name_check(message, addr)
@@ -566,8 +761,6 @@ class Server:
                 self.handle_sciper_check(message, addr)
                 return
 
-            self.client_last_activity[addr] = time.time()
-
             if message.get("action") == "respawn":
                 # Check if the game is over
                 if room.game_over:
@@ -590,57 +783,18 @@ class Server:
                     )
                     return
 
-                # Add the train to the game
-                if room.game.add_train(nickname):
-                    response = {"type": "spawn_success", "nickname": nickname}
-                    self.server_socket.sendto(
-                        (json.dumps(response) + "\n").encode(), addr
-                    )
-                else:
-                    logger.warning(f"Failed to spawn train {nickname}")
-                    # Inform the client of the failure
-                    response = {
-                        "type": "respawn_failed",
-                        "message": "Failed to spawn train",
-                    }
-                    self.server_socket.sendto(
-                        (json.dumps(response) + "\n").encode(), addr
-                    )
+                # The game thread adds the train and answers the client
+                room.game.submit(lambda: self.spawn_train(room, nickname, addr))
+
+            elif message.get("action") == "keyframe":
+                # The client lost some state deltas
+                room.send_keyframe(addr, requested=True)
 
             elif message.get("action") == "direction":
-                if nickname in room.game.trains and room.game.is_train_alive(nickname):
-                    room.game.trains[nickname].change_direction(message["direction"])
-                # else:
-                #     logger.warning(f"Failed to change direction for train {nickname}")
+                room.game.submit_direction(nickname, message["direction"])
 
             elif message.get("action") == "drop_wagon":
-                if nickname in room.game.trains and room.game.is_train_alive(nickname):
-                    last_wagon_position = room.game.trains[nickname].drop_wagon()
-                    if last_wagon_position:
-                        # Create a new passenger at the position of the dropped wagon
-                        new_passenger = Passenger(room.game)
-                        new_passenger.position = last_wagon_position
-                        new_passenger.value = 1
-                        room.game.passengers.append(new_passenger)
-                        room.game._dirty["passengers"] = True
-
-                        # Send a confirmation to the client
-                        response = {
-                            "type": "drop_wagon_success",
-                            "nickname": nickname,
-                            "position": last_wagon_position,
-                        }
-                        self.server_socket.sendto(
-                            (json.dumps(response) + "\n").encode(), addr
-                        )
-                    else:
-                        response = {
-                            "type": "drop_wagon_failed",
-                            "message": "Failed to drop wagon",
-                        }
-                        self.server_socket.sendto(
-                            (json.dumps(response) + "\n").encode(), addr
-                        )
+                room.game.submit(lambda: self.drop_wagon(room, nickname, addr))
 
             # For high scores request
             if "type" in message and message["type"] == "high_scores":
@@ -650,6 +804,38 @@ class Server:
         except Exception as e:
             logger.error(f"Error handling client message: {e}")
 
+    def spawn_train(self, room, nickname, addr):
+        """Add the train of a client to the game, run by the game thread"""
+        if room.game.add_train(nickname):
+            response = {"type": "spawn_success", "nickname": nickname}
+        else:
+            logger.warning(f"Failed to spawn train {nickname}")
+            # Inform the client of the failure
+            response = {
+                "type": "respawn_failed",
+                "message": "Failed to spawn train",
+            }
+        self.server_socket.sendto((json.dumps(response) + "\n").encode(), addr)
+
+    def drop_wagon(self, room, nickname, addr):
+        """Drop a wagon of the train of a client, run by the game thread"""
+        if not room.game.is_train_alive(nickname):
+            return
+        last_wagon_position = room.game.drop_wagon(nickname)
+        if last_wagon_position:
+            # Send a confirmation to the client
+            response = {
+                "type": "drop_wagon_success",
+                "nickname": nickname,
+                "position": last_wagon_position,
+            }
+        else:
+            response = {
+                "type": "drop_wagon_failed",
+                "message": "Failed to drop wagon",
+            }
+        self.server_socket.sendto((json.dumps(response) + "\n").encode(), addr)
+
     def send_cooldown_notification(self, nickname, cooldown):
         """Send a cooldown notification to a specific client"""
         for room in self.rooms.values():
@@ -675,75 +861,91 @@ class Server:
                         )
                         return
 
+    def record_activity(self, addr):
+        """Note that a message was received from a client, pushing back its deadline"""
+        current_time = time.time()
+        self.client_last_activity[addr] = current_time
+        # Only idle clients are pinged
+        self.liveness.schedule(addr, current_time + self.ping_interval)
+
+    def forget_liveness(self, addr):
+        """Cancel the deadline of a client which left"""
+        self.liveness.cancel(addr)
+
     def ping_clients(self):
-        """Thread that sends ping messages to all clients and checks for timeouts"""
+        """
+        Thread that sends ping messages to the clients and checks for timeouts.
+        Only the clients whose deadline expired are handled, and every
+        RTT_PROBE_INTERVAL_SECONDS the round-trip time of the others is measured.
+        """
+        next_rtt_probe_time = time.time()
         while self.running:
             try:
                 current_time = time.time()
+                for addr in self.liveness.pop_expired(current_time):
+                    self.check_idle_client(addr, current_time)
 
-                # PART 1: Check all clients for timeouts
-                for addr, last_activity in list(self.client_last_activity.items()):
-                    # Skip clients that are already marked as disconnected
-                    if addr in self.disconnected_clients:
-                        continue
-
-                    # Check if client has timed out
-                    if (
-                        current_time - last_activity
-                        > self.config.client_timeout_seconds
-                    ):
-                        # Client has timed out, handle disconnection
-                        self.handle_client_disconnection(addr, "timeout")
-
-                # PART 2: Send pings to clients in rooms
-                clients_to_ping = set()
-                for room in self.rooms.values():
-                    for addr in room.clients.keys():
-                        clients_to_ping.add(addr)
-
-                # Send pings to all active clients in rooms
-                for addr in clients_to_ping:
-                    # Skip clients that are already marked as disconnected
-                    if addr in self.disconnected_clients:
-                        continue
-
-                    # Skip AI clients - they don't need network messages
-                    if isinstance(addr, tuple) and len(addr) == 2 and addr[0] == "AI":
-                        continue
-
-                    # Send a ping message to the client
-                    ping_message = {"type": "ping"}
-                    try:
-                        self.server_socket.sendto(
-                            (json.dumps(ping_message) + "\n").encode(), addr
-                        )
-                        # Add the client to the ping responses dictionary with the current time
-                        self.ping_responses[addr] = current_time
-                    except Exception as e:
-                        logger.debug(f"Error sending ping to client {addr}: {e}")
-
-                # Wait for responses (half the ping interval)
-                time.sleep(self.ping_interval / 2)
-
-                # PART 3: Check for clients that haven't responded to pings
-                for addr, ping_time in list(self.ping_responses.items()):
-                    # If the ping was sent more than ping_interval ago and no response was received
-                    if current_time - ping_time > self.ping_interval:
-                        # Skip clients that are already marked as disconnected
-                        if addr in self.disconnected_clients:
-                            del self.ping_responses[addr]
-                            continue
+                if current_time >= next_rtt_probe_time:
+                    self.probe_rtts(current_time)
+                    next_rtt_probe_time = current_time + RTT_PROBE_INTERVAL_SECONDS
 
-                        # Client hasn't responded to ping, mark as disconnected
-                        self.handle_client_disconnection(addr, "ping timeout")
-
-                # Sleep for the remaining time of the ping interval
-                time.sleep(self.ping_interval / 2)
+                time.sleep(LIVENESS_RESOLUTION_SECONDS)
             except Exception as e:
                 logger.error(f"Error in ping_clients: {e}")
                 # Sleep on error to avoid high CPU usage
                 time.sleep(self.ping_interval)
 
+    def check_idle_client(self, addr, current_time):
+        """
+        Called when a client sent nothing for ping_interval: ping it, or
+        disconnect it if it has been idle for client_timeout_seconds, its
+        pings included
+        """
+        idle_since = self.client_last_activity.get(addr, current_time)
+        if current_time - idle_since >= self.config.client_timeout_seconds:
+            self.handle_client_disconnection(addr, "timeout")
+            return
+
+        self.send_ping(addr, current_time)
+        # Check again when the client times out, or when it is due another ping
+        self.liveness.schedule(
+            addr,
+            min(
+                idle_since + self.config.client_timeout_seconds,
+                current_time + self.ping_interval,
+            ),
+        )
+
+    def probe_rtts(self, current_time):
+        """
+        Ping the clients not pinged recently, to measure their round-trip time.
+        The pings don't change the liveness deadlines, the answers push them
+        back like any message.
+        """
+        for addr in list(self.addr_to_name):
+            last_ping_time = self.ping_responses.get(addr)
+            if (
+                last_ping_time is not None
+                and current_time - last_ping_time < RTT_PROBE_INTERVAL_SECONDS
+            ):
+                continue
+            self.send_ping(addr, current_time)
+
+    def send_ping(self, addr, current_time):
+        """Send a ping to a client, its answer gives the round-trip time"""
+        # Only clients which joined a room are pinged
+        if addr not in self.addr_to_name or addr in self.disconnected_clients:
+            return
+
+        # Send a ping message to the client
+        ping_message = {"type": "ping"}
+        try:
+            self.server_socket.sendto((json.dumps(ping_message) + "\n").encode(), addr)
+            # Add the client to the ping responses dictionary with the current time
+            self.ping_responses[addr] = current_time
+        except Exception as e:
+            logger.debug(f"Error sending ping to client {addr}: {e}")
+
     def handle_client_disconnection(self, addr, reason="unknown"):
         """Handle client disconnection - centralized method to avoid code duplication"""
         # Check if client is already marked as disconnected
@@ -789,6 +991,10 @@ class Server:
                         # remove_room handles setting flags, stopping threads, and cleanup
                         self.remove_room(room.id)
                     else:
+                        # The seat freed in a waiting room can be given to a new player
+                        if not room.game_thread:
+                            self.matchmaker.add_open_room(room)
+                            room.waiting_room_changed()
                         # Other human players remain. Create an AI for the disconnecting player's train if it exists.
                         if original_nickname in room.game.trains:
                             logger.info(
@@ -827,6 +1033,22 @@ class Server:
         if addr in self.ping_responses:
             del self.ping_responses[addr]
 
+        self.forget_liveness(addr)
+
+        if addr in self.client_rtts:
+            del self.client_rtts[addr]
+
+        if addr in self.client_acks:
+            del self.client_acks[addr]
+
+        self.input_buckets.pop(addr, None)
+
+        # The session expired, the train was handed to an AI
+        if addr in self.addr_to_session:
+            del self.session_addrs[self.addr_to_session.pop(addr)]
+
+        self.matchmaker.cancel(addr)
+
     def remove_room(self, room_id):
         """Remove a room from the server"""
         if room_id in self.rooms:
@@ -838,45 +1060,50 @@ class Server:
                 logger.debug(f"Signaling game in room {room_id} to stop.")
                 room.game.running = False
 
-            # 2. Signal the room's threads to stop
+            # 2. Signal the room's threads to stop, and drop its delayed tasks
             if room.running:
                 logger.debug(f"Signaling room {room_id} threads to stop.")
                 room.running = False
-
-            # 3. Wait for the game thread to finish if it's running
-            if room.game_thread and room.game_thread.is_alive():
-                logger.info(
-                    f"Waiting for game thread in room {room_id} to terminate before removal"
-                )
-                room.game_thread.join(timeout=2.0)  # Wait a bit
-                if room.game_thread.is_alive():
-                    logger.warning(
-                        f"Game thread for room {room_id} did not terminate gracefully."
-                    )
-
-            # 4. Stop and clean up AI clients associated with this room
-            ai_to_remove = []
-            # Use list() to avoid modification during iteration if necessary, although it might not be strictly needed here
-            for ai_name, ai_client in list(self.rooms[room_id].ai_clients.items()):
-                # Check if ai_client.room exists before accessing id
-                if ai_client.room and ai_client.room.id == room_id:
-                    logger.debug(f"Stopping AI client {ai_name} in room {room_id}")
-                    ai_client.stop()
-                    ai_to_remove.append(ai_name)
-
-            for ai_name in ai_to_remove:
-                if ai_name in self.rooms[room_id].ai_clients:
-                    del self.rooms[room_id].ai_clients[ai_name]
-                if ai_name in self.rooms[room_id].used_ai_names:
-                    # Use discard to avoid KeyError if name somehow already removed
-                    self.rooms[room_id].used_ai_names.discard(ai_name)
+            self.scheduler.cancel(("waiting_room", room_id))
+            self.scheduler.cancel(("end_game", room_id))
+            self.scheduler.cancel(("close_room", room_id))
+
+            # 3. Stop the AI clients associated with this room
+            for ai_name, ai_client in list(room.ai_clients.items()):
+                logger.debug(f"Stopping AI client {ai_name} in room {room_id}")
+                ai_client.stop()
+
+            # 4. Once its threads have stopped, the room is reset and kept for reuse
+            self.scheduler.schedule(
+                ("recycle_room", room_id),
+                ROOM_RECYCLE_DELAY_SECONDS,
+                lambda: self.recycle_room(room),
+            )
 
             # 5. Now remove the room itself
             del self.rooms[room_id]
+            self.matchmaker.remove_room(room_id)
             logger.info(f"Room {room_id} removed successfully")
         else:
             logger.warning(f"Attempted to remove non-existent room {room_id}")
 
+    def recycle_room(self, room):
+        """Reset a removed room and keep it in the pool, if there is space left"""
+        if not room.is_stopped():
+            logger.warning(
+                f"Threads of room {room.id} are still running, not reusing it"
+            )
+            return
+        with self.lock:
+            if len(self.room_pool) >= self.config.room_pool_size:
+                return
+        room.reset()
+        with self.lock:
+            self.room_pool.append(room)
+        logger.debug(
+            f"Room {room.id} recycled, {len(self.room_pool)} rooms in the pool"
+        )
+
     def run(self):
         """Main server loop"""
 
@@ -920,6 +1147,12 @@ class Server:
         else:
             logger.info("No clients connected to disconnect.")
 
+        self.agent_registry.stop_watcher()
+        self.matchmaker.stop()
+        self.scheduler.stop()
+        logger.info(f"Matchmaking: {self.matchmaker.summary()}")
+        logger.info(f"Inputs dropped by the rate limit: {self.nb_inputs_dropped}")
+
         threads_to_join = []
         if hasattr(self, "threads"):  # Check if attribute exists
             threads_to_join.extend(self.threads)
@@ -0,0 +1,69 @@
+"""
+Timer wheel for the server of the game "I Like Trains"
+Tracks many deadlines which are pushed back much more often than they expire
+"""
+
+import threading
+
+
+class TimerWheel:
+    """
+    Deadlines are stored in a ring of slots, one slot per resolution seconds.
+    Scheduling, rescheduling and cancelling a deadline only moves its key
+    between two slots, and pop_expired only looks at the slots of the time
+    elapsed since its previous call. Deadlines further away than a turn of the
+    wheel stay in their slot until they are really due. Methods are
+    thread-safe.
+    """
+
+    def __init__(self, resolution, nb_slots, now):
+        self.resolution = resolution
+        self.slots = [set() for _ in range(nb_slots)]
+        self.deadlines = {}  # {key: (deadline, slot index)}
+        self.current_tick = self.get_tick(now)  # First tick not fully processed
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def get_tick(self, timestamp):
+        return int(timestamp / self.resolution)
+
+    def schedule(self, key, deadline):
+        """Set the deadline of a key, replacing its previous one"""
+        with self.lock:
+            self.remove(key)
+            # A deadline in the past is handled by the next call to pop_expired
+            tick = max(self.get_tick(deadline), self.current_tick)
+            index = tick % len(self.slots)
+            self.deadlines[key] = (deadline, index)
+            self.slots[index].add(key)
+
+    def cancel(self, key):
+        """Remove the deadline of a key, if any"""
+        with self.lock:
+            self.remove(key)
+
+    def remove(self, key):
+        # The caller holds the lock
+        previous = self.deadlines.pop(key, None)
+        if previous is not None:
+            self.slots[previous[1]].discard(key)
+
+    def pop_expired(self, now):
+        """Remove and return the keys whose deadline is before now"""
+        expired = []
+        with self.lock:
+            now_tick = self.get_tick(now)
+            # No need to look at a slot twice, even if a lot of time elapsed
+            last_tick = min(now_tick, self.current_tick + len(self.slots) - 1)
+            for tick in range(self.current_tick, last_tick + 1):
+                slot = self.slots[tick % len(self.slots)]
+                for key in list(slot):
+                    if self.deadlines[key][0] <= now:
+                        slot.discard(key)
+                        del self.deadlines[key]
+                        expired.append(key)
+            # The slot of now_tick may still hold deadlines later in this tick
+            self.current_tick = now_tick
+        return expired
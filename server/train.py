@@ -218,12 +218,14 @@ class Train:
 
     def serialize(self):
         """
-        Convert train state to a serializable format for sending to the client
+        Convert train state to a serializable format for sending to the client.
+        Called outside of the game thread, so the wagons are copied before the
+        game thread moves them.
         """
         return {
-            "position": self.position,
-            "wagons": self.wagons,
-            "direction": self.direction,
+            "position": tuple(self.position),
+            "wagons": list(self.wagons),
+            "direction": tuple(self.direction),
             "score": self.score,
             "color": self.color,
             "alive": self.alive,
@@ -239,7 +241,8 @@ class Train:
         if self._dirty["wagons"]:
             # Verify that all wagons have valid positions
             valid_wagons = []
-            for wagon in self.wagons:
+            # A copy, the game thread may move the wagons meanwhile
+            for wagon in list(self.wagons):
                 if (
                     wagon is not None
                     and isinstance(wagon, tuple)